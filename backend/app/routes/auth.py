@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify, current_app
 from utilities.authentication import Authentication
 from werkzeug.security import check_password_hash
-from utilities.keycloak_authentication import delete_keycloak_user, find_keycloak_user_by_email, keycloak_token_required
+from utilities.keycloak_authentication import delete_keycloak_user, find_keycloak_user_by_email, keycloak_token_required, get_bearer_token, invalidate_token, invalidate_user_tokens
 from utilities.security_utils import InputValidator, rate_limit_decorator
+from classes.prescription import remove_files
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -83,18 +84,21 @@ def delete_account():
             keycloak_user_id = find_keycloak_user_by_email(user[2])
             if keycloak_user_id:
                 delete_result = delete_keycloak_user(keycloak_user_id)
+                invalidate_user_tokens(keycloak_user_id)
         except Exception as ke:
             print(f"Error deleting user from Keycloak: {str(ke)}")
         cur.execute(
-            "DELETE FROM prescriptions WHERE user_id = %s",
+            "DELETE FROM prescriptions WHERE user_id = %s RETURNING pdf_object_key",
             (user[0],)
         )
+        object_keys = [row[0] for row in cur.fetchall()]
 
         cur.execute(
             "DELETE FROM users WHERE id = %s",
             (user[0],)
         )
         conn.commit()
+        remove_files(object_keys)
 
         return jsonify({'message': 'Account deleted successfully'}), 200
 
@@ -111,6 +115,7 @@ def delete_account():
 @keycloak_token_required
 def logout(user_id, roles):
     try:
+        invalidate_token(get_bearer_token())
         return jsonify({'message': 'Logout successful'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,11 +1,15 @@
 from flask import Blueprint, request, jsonify, current_app
 from utilities.keycloak_authentication import keycloak_token_required
+from utilities.versions import bump_version, conditional_get
 
 doctors_bp = Blueprint('doctors', __name__)
 
 @doctors_bp.route('/doctors', methods=['POST'])
 @keycloak_token_required
 def add_doctor_info(user_id, roles):
+    conn = None
+    cur = None
+
     try:
         data = request.get_json()
         conn = current_app.db_pool.getconn()
@@ -27,6 +31,7 @@ def add_doctor_info(user_id, roles):
         """, (data['first_name'], data['last_name'], user_id))
 
         doctor_id = cur.fetchone()[0]
+        bump_version(cur, user_id, 'doctors')
         conn.commit()
         return jsonify({'id': doctor_id}), 201
 
@@ -42,7 +47,11 @@ def add_doctor_info(user_id, roles):
 
 @doctors_bp.route('/doctors', methods=['GET'])
 @keycloak_token_required
+@conditional_get('doctors')
 def get_doctor_info(user_id, roles):
+    conn = None
+    cur = None
+
     try:
         conn = current_app.db_pool.getconn()
         cur = conn.cursor()
@@ -74,6 +83,9 @@ def get_doctor_info(user_id, roles):
 @doctors_bp.route('/doctors', methods=['PUT'])
 @keycloak_token_required
 def update_doctor_info(user_id, roles):
+    conn = None
+    cur = None
+
     try:
         data = request.get_json()
         conn = current_app.db_pool.getconn()
@@ -89,6 +101,7 @@ def update_doctor_info(user_id, roles):
         if cur.fetchone() is None:
             return jsonify({'error': 'Doctor info not found'}), 404
 
+        bump_version(cur, user_id, 'doctors')
         conn.commit()
         return jsonify({'message': 'Doctor info updated successfully'}), 200
 
@@ -105,6 +118,9 @@ def update_doctor_info(user_id, roles):
 @doctors_bp.route('/doctors', methods=['DELETE'])
 @keycloak_token_required
 def delete_doctor_info(user_id, roles):
+    conn = None
+    cur = None
+
     try:
         conn = current_app.db_pool.getconn()
         cur = conn.cursor()
@@ -118,6 +134,7 @@ def delete_doctor_info(user_id, roles):
         if cur.fetchone() is None:
             return jsonify({'error': 'Doctor info not found'}), 404
 
+        bump_version(cur, user_id, 'doctors')
         conn.commit()
         return jsonify({'message': 'Doctor info deleted successfully'}), 200
 
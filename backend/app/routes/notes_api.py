@@ -1,12 +1,48 @@
 from flask import Blueprint, request, jsonify, current_app
 from utilities.keycloak_authentication import keycloak_token_required
+from utilities.versions import bump_version, conditional_get
+from utilities.db import Statement, execute, transaction
+from utilities.pagination import Page, paginate, page_limit, parse_page_args, page_response, NO_CURSOR
 import json
 
 notes_bp = Blueprint('notes', __name__)
 
+MAX_SEARCH_LENGTH = 200
+
+LIST_NOTES = Statement('notes_list', """
+    SELECT id, note_name, created_at
+    FROM notes
+    WHERE user_id = $1 AND (created_at, id) < ($2, $3)
+    ORDER BY created_at DESC, id DESC
+    LIMIT $4
+""", 4)
+
+# note_title is a stored copy of the name, so the long content is never read
+LIST_NOTE_SUMMARIES = Statement('notes_list_summary', """
+    SELECT id, note_title, created_at
+    FROM notes
+    WHERE user_id = $1 AND (created_at, id) < ($2, $3)
+    ORDER BY created_at DESC, id DESC
+    LIMIT $4
+""", 4)
+
+SEARCH_NOTES = Statement('notes_search', """
+    SELECT id, note_title, created_at
+    FROM notes, websearch_to_tsquery('simple', $1) AS tsq
+    WHERE user_id = $2 AND note_tsv @@ tsq
+    AND (created_at, id) < ($3, $4)
+    ORDER BY created_at DESC, id DESC
+    LIMIT $5
+""", 5)
+
+NOTE_VIEWS = {'full': LIST_NOTES, 'summary': LIST_NOTE_SUMMARIES}
+
 @notes_bp.route('/notes', methods=['POST'])
 @keycloak_token_required
 def add_note(current_user_id, roles):
+    conn = None
+    cur = None
+
     try:
         data = request.get_json()
         note_content = {
@@ -24,6 +60,7 @@ def add_note(current_user_id, roles):
         """, (current_user_id, json.dumps(note_content)))
         
         note_id = cur.fetchone()[0]
+        bump_version(cur, current_user_id, 'notes')
         conn.commit()
         return jsonify({'id': note_id}), 201
         
@@ -39,34 +76,60 @@ def add_note(current_user_id, roles):
 
 @notes_bp.route('/notes', methods=['GET'])
 @keycloak_token_required
+@conditional_get('notes')
 def get_all_notes(current_user_id, roles):
+    view = request.args.get('view', 'full')
+    if view not in NOTE_VIEWS:
+        return jsonify({'error': f'Invalid view. Allowed: {", ".join(NOTE_VIEWS)}'}), 400
     try:
-        conn = current_app.db_pool.getconn()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT id, note_name
-            FROM notes
-            WHERE user_id = %s
-        """, (current_user_id,))
-        
-        notes = cur.fetchall()
-        return jsonify([{
-            'id': note[0],
-            'note': note[1]
-        } for note in notes]), 200
-        
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        with transaction() as cur:
+            execute(cur, NOTE_VIEWS[view], (current_user_id, *(cursor or NO_CURSOR), page_limit(limit)))
+            notes, next_cursor = paginate(cur.fetchall(), limit, lambda note: (note[2], note[0]))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            current_app.db_pool.putconn(conn)
+
+    if view == 'summary':
+        items = [{'id': note[0], 'name': note[1], 'created_at': note[2]} for note in notes]
+    else:
+        items = [{'id': note[0], 'note': note[1]} for note in notes]
+    return page_response(Page(items, next_cursor)), 200
+
+@notes_bp.route('/notes/search', methods=['GET'])
+@keycloak_token_required
+@conditional_get('notes')
+def search_notes(current_user_id, roles):
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search query is required'}), 400
+    if len(query) > MAX_SEARCH_LENGTH:
+        return jsonify({'error': f'Search query must be at most {MAX_SEARCH_LENGTH} characters'}), 400
+    try:
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        with transaction() as cur:
+            execute(cur, SEARCH_NOTES, (query, current_user_id, *(cursor or NO_CURSOR), page_limit(limit)))
+            notes, next_cursor = paginate(cur.fetchall(), limit, lambda note: (note[2], note[0]))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return page_response(Page([
+        {'id': note[0], 'name': note[1], 'created_at': note[2]} for note in notes
+    ], next_cursor)), 200
 
 @notes_bp.route('/notes/<int:note_id>', methods=['PUT'])
 @keycloak_token_required
 def update_note(current_user_id, roles, note_id):
+    conn = None
+    cur = None
+
     try:
         data = request.get_json()
         note_content = {
@@ -86,7 +149,8 @@ def update_note(current_user_id, roles, note_id):
         
         if cur.fetchone() is None:
             return jsonify({'error': 'Note not found'}), 404
-            
+
+        bump_version(cur, current_user_id, 'notes')
         conn.commit()
         return jsonify({'message': 'Note updated successfully'}), 200
         
@@ -103,6 +167,9 @@ def update_note(current_user_id, roles, note_id):
 @notes_bp.route('/notes/<int:note_id>', methods=['DELETE'])
 @keycloak_token_required
 def delete_note(current_user_id, roles, note_id):
+    conn = None
+    cur = None
+
     try:
         conn = current_app.db_pool.getconn()
         cur = conn.cursor()
@@ -115,7 +182,8 @@ def delete_note(current_user_id, roles, note_id):
         
         if cur.fetchone() is None:
             return jsonify({'error': 'Note not found'}), 404
-            
+
+        bump_version(cur, current_user_id, 'notes')
         conn.commit()
         return jsonify({'message': 'Note deleted successfully'}), 200
         
@@ -132,6 +200,9 @@ def delete_note(current_user_id, roles, note_id):
 @notes_bp.route('/notes', methods=['DELETE'])
 @keycloak_token_required
 def delete_all_notes(current_user_id, roles):
+    conn = None
+    cur = None
+
     try:
         conn = current_app.db_pool.getconn()
         cur = conn.cursor()
@@ -143,6 +214,8 @@ def delete_all_notes(current_user_id, roles):
         """, (current_user_id,))
         
         deleted = cur.fetchall()
+        if deleted:
+            bump_version(cur, current_user_id, 'notes')
         conn.commit()
         return jsonify({
             'message': 'All notes deleted successfully',
@@ -160,7 +233,11 @@ def delete_all_notes(current_user_id, roles):
             current_app.db_pool.putconn(conn)
 @notes_bp.route('/notes/<int:note_id>', methods=['GET'])
 @keycloak_token_required
+@conditional_get('notes')
 def get_note(current_user_id, role, note_id):
+    conn = None
+    cur = None
+
     try:
         conn = current_app.db_pool.getconn()
         cur = conn.cursor()
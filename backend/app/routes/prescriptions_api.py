@@ -1,26 +1,87 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from werkzeug.utils import secure_filename
 import os
-from datetime import datetime
+import io
+import csv
+import json
+from datetime import datetime, timedelta
 from utilities.keycloak_authentication import keycloak_token_required
 from utilities.security_utils import InputValidator, validate_file_upload, rate_limit_decorator
 from classes.prescription import Prescription_Methods
+from utilities.pagination import parse_page_args, page_response
+from utilities.minio_handler import UploadRejected, storage_available
+from utilities.versions import conditional_get
+from utilities.serialization import dumps
 from utilities.security_utils import InputValidator, validate_file_upload, rate_limit_decorator
 
 prescriptions_bp = Blueprint('prescriptions', __name__)
 
 UPLOAD_FOLDER = 'prescriptions'
 ALLOWED_EXTENSIONS = {'pdf'}
+UPLOAD_URL_EXPIRY = timedelta(minutes=10)
+IMPORT_MAX_REPORTED_ERRORS = 1000
+EXPORT_COLUMNS = ['id', 'first_name', 'last_name', 'pesel', 'issue_date', 'expiry_date', 'pdf_object_key', 'med_info']
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def validate_prescription_data(data):
+    required_keys = ['first_name', 'last_name', 'pesel', 'issue_date', 'expiry_date']
+    missing_keys = [key for key in required_keys if key not in data]
+    if missing_keys:
+        return f'Missing required fields: {", ".join(missing_keys)}'
+    if not all(isinstance(data[key], str) for key in required_keys):
+        return 'Invalid field type'
+    if not InputValidator.validate_name(data['first_name']):
+        return 'Invalid first name format'
+    if not InputValidator.validate_name(data['last_name']):
+        return 'Invalid last name format'
+    if not InputValidator.validate_pesel(data['pesel']):
+        return 'Invalid PESEL number'
+    if not InputValidator.validate_date(data['issue_date']):
+        return 'Invalid issue date'
+    if not InputValidator.validate_date(data['expiry_date']):
+        return 'Invalid expiry date'
+    return None
+
+def iter_import_rows():
+    content_type = (request.mimetype or '').lower()
+    if content_type == 'application/json':
+        rows = request.get_json(silent=True)
+        if not isinstance(rows, list):
+            raise ValueError('Expected a JSON array of prescriptions')
+        yield from rows
+    elif content_type in ('application/x-ndjson', 'application/jsonl'):
+        for line in io.TextIOWrapper(request.stream, encoding='utf-8'):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+    elif content_type == 'text/csv':
+        yield from csv.DictReader(io.TextIOWrapper(request.stream, encoding='utf-8', newline=''))
+    else:
+        raise ValueError('Unsupported content type. Use application/json, application/x-ndjson or text/csv')
+
+def build_object_key(user_id, filename):
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"{UPLOAD_FOLDER}/{user_id}/{secure_filename(f'{user_id}_{timestamp}_{filename}')}"
+
 @prescriptions_bp.route('/prescriptions', methods=['GET'])
 @keycloak_token_required
+@conditional_get('prescriptions', presigned_urls=True)
 def get_all_prescriptions(user_id, roles):
-    success, result = Prescription_Methods.findAllPrescriptions(user_id)
+    try:
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    success, result = Prescription_Methods.findAllPrescriptions(user_id, limit, cursor)
     if success:
-        return jsonify(result), 200
+        return page_response(result), 200
     return jsonify({'error': result}), 404
 
 @prescriptions_bp.route('/prescriptions', methods=['POST'])
@@ -28,9 +89,6 @@ def get_all_prescriptions(user_id, roles):
 @validate_file_upload
 @rate_limit_decorator(max_requests=10, per_seconds=60)  
 def add_prescription(user_id, roles):
-    conn = None
-    cur = None
-
     try:
         if 'pdf_file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -40,193 +98,229 @@ def add_prescription(user_id, roles):
             return jsonify({'error': 'Invalid file'}), 400
 
         data = request.form
-        required_keys = ['first_name', 'last_name', 'pesel', 'issue_date', 'expiry_date']
-        missing_keys = [key for key in required_keys if key not in data]
-        if missing_keys:
-            return jsonify({'error': f'Missing required fields: {", ".join(missing_keys)}'}), 400
-        if not InputValidator.validate_name(data['first_name']):
-            return jsonify({'error': 'Invalid first name format'}), 400
-        
-        if not InputValidator.validate_name(data['last_name']):
-            return jsonify({'error': 'Invalid last name format'}), 400
-        
-        if not InputValidator.validate_pesel(data['pesel']):
-            return jsonify({'error': 'Invalid PESEL number'}), 400
-        first_name = InputValidator.sanitize_string(data['first_name'])
-        last_name = InputValidator.sanitize_string(data['last_name'])
-        pesel = data['pesel']  
-        med_info = InputValidator.sanitize_string(data.get('med_info_for_search', ''))
-        if not current_app.minio_handler:
+        error = validate_prescription_data(data)
+        if error:
+            return jsonify({'error': error}), 400
+        if not storage_available():
             return jsonify({'error': 'File storage service is currently unavailable'}), 503
 
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = secure_filename(f"{user_id}_{timestamp}_{file.filename}")
-        file_path = f"prescriptions/{user_id}/{filename}"
-        file_url = current_app.minio_handler.upload_file(
+        file_path = build_object_key(user_id, file.filename)
+        current_app.minio_handler.upload_file(
             file_path,
-            file.read(),
-            content_type="application/pdf"
+            file.stream,
+            content_type="application/pdf",
+            max_size=current_app.config['MAX_FILE_SIZE'],
+            magic=b'%PDF'
         )
-
-        conn = current_app.db_pool.getconn()
-        cur = conn.cursor()
-
-        cur.execute("""
-            INSERT INTO prescriptions 
-            (user_id, first_name, last_name, pesel, issue_date, expiry_date, pdf_url, med_info_for_search)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (
-            user_id,
-            first_name,
-            last_name,
-            pesel,
-            data['issue_date'],
-            data['expiry_date'],
-            file_url,
-            med_info
-        ))
-
-        prescription_id = cur.fetchone()[0]
-        conn.commit()
-
-        return jsonify({
-            'message': 'Prescription added successfully',
-            'prescription_id': prescription_id,
-            'pdf_url': file_url
-        }), 201
-
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        if conn:
-            conn.rollback()
         return jsonify({'error': str(e)}), 500
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            current_app.db_pool.putconn(conn)
 
-@prescriptions_bp.route('/prescriptions/no-pdf', methods=['POST'])
+    success, result = Prescription_Methods.addPrescription(
+        user_id,
+        InputValidator.sanitize_string(data['first_name']),
+        InputValidator.sanitize_string(data['last_name']),
+        data['pesel'],
+        data['issue_date'],
+        data['expiry_date'],
+        file_path,
+        InputValidator.sanitize_string(data.get('med_info_for_search', ''))
+    )
+    if not success:
+        # nothing references the upload, so do not leave it behind in the bucket
+        current_app.minio_handler.delete_file(file_path)
+        return jsonify({'error': result}), 500
+    return jsonify({
+        'message': 'Prescription added successfully',
+        'prescription_id': result,
+        'pdf_url': current_app.minio_handler.get_file_url(file_path)
+    }), 201
+
+@prescriptions_bp.route('/prescriptions/upload-url', methods=['POST'])
 @keycloak_token_required
-def add_prescription_no_pdf(user_id, roles):
-    conn = None
-    cur = None
+@rate_limit_decorator(max_requests=10, per_seconds=60)
+def create_upload_url(user_id, roles):
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', 'prescription.pdf')
+    if not allowed_file(filename):
+        return jsonify({'error': 'Invalid file'}), 400
+    if not storage_available():
+        return jsonify({'error': 'File storage service is currently unavailable'}), 503
 
     try:
-        data = request.get_json()
-        if not all(key in data for key in ['first_name', 'last_name', 'pesel', 'issue_date', 'expiry_date']):
-            return jsonify({'error': 'Missing required fields'}), 400
-
-        conn = current_app.db_pool.getconn()
-        cur = conn.cursor()
-
-        cur.execute("""
-            INSERT INTO prescriptions 
-            (user_id, first_name, last_name, pesel, issue_date, expiry_date, med_info_for_search)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (
-            user_id,
-            data['first_name'],
-            data['last_name'],
-            data['pesel'],
-            data['issue_date'],
-            data['expiry_date'],
-            data.get('med_info_for_search', '')
-        ))
-        prescription_id = cur.fetchone()[0]
-        conn.commit()
-
+        object_key = build_object_key(user_id, filename)
+        url, fields = current_app.minio_handler.presigned_post(
+            object_key,
+            max_size=current_app.config['MAX_FILE_SIZE'],
+            content_type='application/pdf',
+            expires=UPLOAD_URL_EXPIRY
+        )
         return jsonify({
-            'message': 'Prescription added successfully',
-            'prescription_id': prescription_id
-        }), 201
-
+            'url': url,
+            'fields': fields,
+            'object_key': object_key,
+            'expires_in': int(UPLOAD_URL_EXPIRY.total_seconds())
+        }), 200
     except Exception as e:
-        if conn:
-            conn.rollback()
         return jsonify({'error': str(e)}), 500
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            current_app.db_pool.putconn(conn)
 
-@prescriptions_bp.route('/prescriptions/<int:prescription_id>', methods=['GET'])
+@prescriptions_bp.route('/prescriptions/finalize', methods=['POST'])
 @keycloak_token_required
-def get_prescription(user_id, roles, prescription_id):
-    conn = None
-    cur = None
+def finalize_upload(user_id, roles):
+    data = request.get_json(silent=True) or {}
+    object_key = data.get('object_key', '')
+    if not object_key.startswith(f"{UPLOAD_FOLDER}/{user_id}/") or '..' in object_key:
+        return jsonify({'error': 'Invalid object key'}), 400
+    error = validate_prescription_data(data)
+    if error:
+        return jsonify({'error': error}), 400
+    if not storage_available():
+        return jsonify({'error': 'File storage service is currently unavailable'}), 503
 
     try:
-        conn = current_app.db_pool.getconn()
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT * FROM prescriptions 
-            WHERE id = %s AND user_id = %s
-        """, (prescription_id, user_id))
-
-        prescription = cur.fetchone()
-        if not prescription:
-            return jsonify({'error': 'Prescription not found'}), 404
+        size, header = current_app.minio_handler.inspect_object(object_key, 4)
+    except Exception:
+        return jsonify({'error': 'Uploaded file not found'}), 404
+    if size > current_app.config['MAX_FILE_SIZE'] or header != b'%PDF':
+        current_app.minio_handler.delete_file(object_key)
+        return jsonify({'error': 'Invalid PDF file'}), 400
+
+    success, result = Prescription_Methods.addPrescription(
+        user_id,
+        InputValidator.sanitize_string(data['first_name']),
+        InputValidator.sanitize_string(data['last_name']),
+        data['pesel'],
+        data['issue_date'],
+        data['expiry_date'],
+        object_key,
+        InputValidator.sanitize_string(data.get('med_info_for_search', ''))
+    )
+    if result == "File is already attached to a prescription":
+        return jsonify({'error': result}), 409
+    if not success:
+        return jsonify({'error': result}), 500
+    return jsonify({
+        'message': 'Prescription added successfully',
+        'prescription_id': result,
+        'pdf_url': current_app.minio_handler.get_file_url(object_key)
+    }), 201
+
+@prescriptions_bp.route('/prescriptions/import', methods=['POST'])
+@keycloak_token_required
+@rate_limit_decorator(max_requests=5, per_seconds=60)
+def import_prescriptions(user_id, roles):
+    max_rows = current_app.config['IMPORT_MAX_ROWS']
+    valid_rows = []
+    errors = []
+    failed = 0
 
-        columns = ['id', 'user_id', 'first_name', 'last_name', 'pesel', 
-                  'issue_date', 'expiry_date', 'pdf_url', 'med_info_for_search']
-        prescription_dict = dict(zip(columns, prescription))
+    try:
+        for row_number, data in enumerate(iter_import_rows(), start=1):
+            if row_number > max_rows:
+                return jsonify({'error': f'Too many rows. Maximum is {max_rows}'}), 413
+            error = validate_prescription_data(data) if isinstance(data, dict) else 'Malformed row'
+            if error:
+                failed += 1
+                if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+                    errors.append({'row': row_number, 'error': error})
+                continue
+            valid_rows.append((
+                InputValidator.sanitize_string(data['first_name']),
+                InputValidator.sanitize_string(data['last_name']),
+                data['pesel'],
+                data['issue_date'],
+                data['expiry_date'],
+                InputValidator.sanitize_string(data.get('med_info_for_search', ''))
+            ))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not valid_rows:
+        return jsonify({'imported': 0, 'failed': failed, 'errors': errors}), 400
+
+    success, result = Prescription_Methods.bulkInsertPrescriptions(user_id, valid_rows)
+    if not success:
+        return jsonify({'error': result}), 500
+    return jsonify({'imported': result, 'failed': failed, 'errors': errors}), 201
 
-        return jsonify(prescription_dict), 200
+@prescriptions_bp.route('/prescriptions/no-pdf', methods=['POST'])
+@keycloak_token_required
+def add_prescription_no_pdf(user_id, roles):
+    data = request.get_json(silent=True) or {}
+    if not all(key in data for key in ['first_name', 'last_name', 'pesel', 'issue_date', 'expiry_date']):
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    success, result = Prescription_Methods.addPrescription(
+        user_id,
+        data['first_name'],
+        data['last_name'],
+        data['pesel'],
+        data['issue_date'],
+        data['expiry_date'],
+        None,
+        data.get('med_info_for_search', '')
+    )
+    if not success:
+        return jsonify({'error': result}), 500
+    return jsonify({
+        'message': 'Prescription added successfully',
+        'prescription_id': result
+    }), 201
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            current_app.db_pool.putconn(conn)
+@prescriptions_bp.route('/prescriptions/<int:prescription_id>', methods=['GET'])
+@keycloak_token_required
+@conditional_get('prescriptions', presigned_urls=True)
+def get_prescription(user_id, roles, prescription_id):
+    success, result = Prescription_Methods.getPrescription(user_id, prescription_id)
+    if success:
+        return jsonify(result), 200
+    if result == "Prescription not found":
+        return jsonify({'error': result}), 404
+    return jsonify({'error': result}), 500
 
 @prescriptions_bp.route('/prescriptions/<int:prescription_id>', methods=['DELETE'])
 @keycloak_token_required
 def delete_prescription(user_id, roles, prescription_id):
-    conn = None
-    cur = None
-
-    try:
-        conn = current_app.db_pool.getconn()
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT pdf_url FROM prescriptions 
-            WHERE id = %s AND user_id = %s
-        """, (prescription_id, user_id))
-
-        prescription = cur.fetchone()
-        if not prescription:
-            return jsonify({'error': 'Prescription not found'}), 404
-
-        if prescription[0] and current_app.minio_handler:
-            file_path = '/'.join(prescription[0].split('/')[-3:])
-            current_app.minio_handler.delete_file(file_path)
-        elif prescription[0] and not current_app.minio_handler:
-            current_app.logger.warning(f"Cannot delete file {prescription[0]} - MinIO unavailable")
-
-        cur.execute("""
-            DELETE FROM prescriptions 
-            WHERE id = %s AND user_id = %s
-        """, (prescription_id, user_id))
-
-        conn.commit()
-        return jsonify({'message': 'Prescription deleted successfully'}), 200
+    success, result = Prescription_Methods.deletePrescription(user_id, prescription_id)
+    if success:
+        return jsonify({'message': result}), 200
+    if result == "Prescription not found":
+        return jsonify({'error': result}), 404
+    return jsonify({'error': result}), 500
 
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        return jsonify({'error': str(e)}), 500
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            current_app.db_pool.putconn(conn)
+@prescriptions_bp.route('/prescriptions/export', methods=['GET'])
+@keycloak_token_required
+def export_prescriptions(user_id, roles):
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Invalid format. Allowed: {", ".join(EXPORT_FORMATS)}'}), 400
+
+    chunks = Prescription_Methods.iterPrescriptions(user_id)
+
+    def generate():
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue()
+        for rows in chunks:
+            if export_format == 'csv':
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(rows)
+                yield buffer.getvalue()
+            else:
+                yield b''.join(dumps(dict(zip(EXPORT_COLUMNS, row))) + b'\n' for row in rows)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename=prescriptions.{export_format}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
 
 @prescriptions_bp.route('/prescriptions/search/person', methods=['GET'])
 @keycloak_token_required
@@ -238,24 +332,37 @@ def find_by_person(user_id, roles):
     
     if not first_name or not last_name:
         return jsonify({'error': 'First name and last name are required'}), 400
+    try:
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
         
     success, result = Prescription_Methods.findPrescriptionsByPerson(
-        user_id, first_name, last_name, start_date, end_date
+        user_id, first_name, last_name, start_date, end_date, limit, cursor
     )
     if success:
-        return jsonify(result), 200
+        return page_response(result), 200
     return jsonify({'error': result}), 404
 
 @prescriptions_bp.route('/prescriptions/search/medication', methods=['GET'])
 @keycloak_token_required
 def find_by_medication(user_id, roles):
     med_pattern = request.args.get('medication')
+    sort = request.args.get('sort', 'date')
     if not med_pattern:
         return jsonify({'error': 'Medication pattern is required'}), 400
+    if sort not in ('date', 'relevance'):
+        return jsonify({'error': 'sort must be date or relevance'}), 400
+    try:
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if cursor and sort == 'relevance':
+        return jsonify({'error': 'Relevance results are a single page; cursor requires sort=date'}), 400
         
-    success, result = Prescription_Methods.findByMedication(user_id, med_pattern)
+    success, result = Prescription_Methods.findByMedication(user_id, med_pattern, limit, cursor, sort)
     if success:
-        return jsonify(result), 200
+        return page_response(result), 200
     return jsonify({'error': result}), 404
 
 @prescriptions_bp.route('/prescriptions/person', methods=['DELETE'])
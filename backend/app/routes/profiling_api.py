@@ -0,0 +1,35 @@
+from flask import Blueprint, request, jsonify, Response
+from utilities.profiling import profiling_admin_required, render_pstats, dump_pstats, render_collapsed
+
+profiling_bp = Blueprint('profiling', __name__)
+
+@profiling_bp.route('/admin/profiles', methods=['GET'])
+@profiling_admin_required
+def list_profiles(profiler):
+    return jsonify(profiler.profiles()), 200
+
+@profiling_bp.route('/admin/profiles/<profile_id>', methods=['GET'])
+@profiling_admin_required
+def get_profile(profiler, profile_id):
+    profile = profiler.get(profile_id)
+    if not profile:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    output_format = request.args.get('format', 'collapsed' if profile['mode'] == 'sample' else 'text')
+    if profile['mode'] == 'sample':
+        if output_format != 'collapsed':
+            return jsonify({'error': 'Sampled profiles are only available as collapsed stacks'}), 400
+        return Response(render_collapsed(profile['data']), mimetype='text/plain')
+
+    if output_format == 'text':
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'calls'):
+            return jsonify({'error': 'Invalid sort'}), 400
+        return Response(render_pstats(profile['data'], sort), mimetype='text/plain')
+    if output_format == 'pstats':
+        return Response(
+            dump_pstats(profile['data']),
+            mimetype='application/octet-stream',
+            headers={'Content-Disposition': f'attachment; filename=profile-{profile_id}.prof'}
+        )
+    return jsonify({'error': 'format must be text or pstats'}), 400
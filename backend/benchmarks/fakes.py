@@ -0,0 +1,153 @@
+"""Local stand-ins for Keycloak, PostgreSQL and MinIO used by the benchmarks and unit tests."""
+import json
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from types import SimpleNamespace
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import jwt
+import psycopg2
+from psycopg2 import extensions
+from jwt.algorithms import RSAAlgorithm
+from cryptography.hazmat.primitives.asymmetric import rsa
+from minio import Minio
+from utilities.minio_handler import MinioHandler
+
+class FakeRealm:
+    """Serves a JWKS document for a locally generated RS256 key on every GET path."""
+
+    def __init__(self, kid='benchmark-key', host='127.0.0.1', port=0):
+        self.kid = kid
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = json.loads(RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        jwk.update(kid=kid, use='sig', alg='RS256')
+        body = json.dumps({'keys': [jwk]}).encode('utf-8')
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def token(self, sub=None, expires_in=300, roles=('user',)):
+        claims = {
+            'sub': sub or str(uuid.uuid4()),
+            'exp': int(time.time()) + expires_in,
+            'realm_access': {'roles': list(roles)}
+        }
+        return jwt.encode(claims, self.private_key, algorithm='RS256', headers={'kid': self.kid})
+
+    def close(self):
+        self.server.shutdown()
+
+def prescription_rows(count):
+    """Rows shaped like the prescription listing queries return them."""
+    issue = date(2024, 1, 1)
+    return [(
+        count - i,
+        'Jan',
+        'Kowalski',
+        '44051401359',
+        issue - timedelta(days=i),
+        issue - timedelta(days=i) + timedelta(days=30),
+        f"prescriptions/{uuid.UUID(int=i)}/scan_{i}.pdf",
+        'Amoxicillin 500mg, 3x daily'
+    ) for i in range(count)]
+
+class FakeCursor:
+    def __init__(self, connection, rows):
+        self.connection = connection
+        self.rows = rows
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def execute(self, query, params=None):
+        if self.connection.broken:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        self.connection.executed.append((query, params))
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchmany(self, size=None):
+        return []
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    """Records executed SQL and carries the session state BlockingConnectionPool inspects."""
+
+    def __init__(self, rows=()):
+        self.rows = rows
+        self.prepared_statements = set()
+        self.executed = []
+        self.broken = False
+        self.closed = 0
+        self.autocommit = False
+        self.readonly = None
+        self.deferrable = None
+        self.isolation_level = None
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.calls = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self, self.rows)
+
+    def commit(self):
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.calls.append('rollback')
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def reset(self):
+        self.calls.append('reset')
+        self.autocommit = False
+        self.readonly = self.deferrable = self.isolation_level = None
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+class FakePool:
+    """getconn/putconn pool whose cursors return a fixed result set."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.closed = False
+
+    def getconn(self, key=None, timeout=None):
+        return FakeConnection(self.rows)
+
+    def putconn(self, conn, key=None, close=False):
+        pass
+
+def offline_minio_handler(bucket_name='prescriptions'):
+    """MinioHandler with a real client that only signs URLs; the region is fixed so nothing is fetched."""
+    handler = MinioHandler()
+    handler.bucket_name = bucket_name
+    handler.public_url = 'https://localhost/minio'
+    handler.client = Minio('minio.invalid:9000', access_key='benchmark', secret_key='benchmark',
+                           secure=False, region='us-east-1')
+    return handler
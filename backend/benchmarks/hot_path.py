@@ -0,0 +1,253 @@
+"""Offline micro-benchmarks of the request hot path.
+
+Keycloak, PostgreSQL and MinIO are replaced by the stand-ins in benchmarks.fakes,
+so only the application code is measured. Run from the backend directory:
+
+    python -m benchmarks.hot_path --output baseline.json
+    python -m benchmarks.hot_path --compare baseline.json
+"""
+import argparse
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from flask import Flask, jsonify
+from benchmarks.fakes import FakeRealm, FakePool, prescription_rows, offline_minio_handler
+from classes.prescription import Prescription_Methods
+from utilities.keycloak_authentication import keycloak_token_required, token_cache
+from utilities.security_utils import InputValidator, validate_file_upload
+from utilities.serialization import OrjsonProvider
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    """Register a generator that sets up, yields the operation to time, then cleans up."""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def make_app(realm, rows=()):
+    app = Flask('benchmarks')
+    app.json = OrjsonProvider(app)
+    app.config['KEYCLOAK_URL'] = realm.url
+    app.config['KEYCLOAK_REALM'] = 'datamed'
+    app.db_pool = FakePool(rows)
+    app.minio_handler = offline_minio_handler()
+    return app
+
+@keycloak_token_required
+def protected_view(user_id, roles):
+    return user_id
+
+@validate_file_upload
+def upload_view():
+    return None
+
+def _authenticated(realm, clear_cache):
+    app = make_app(realm)
+    ctx = app.test_request_context(headers={'Authorization': f'Bearer {realm.token()}'})
+    ctx.push()
+    try:
+        if clear_cache:
+            def run():
+                token_cache.clear()
+                return protected_view()
+        else:
+            run = protected_view
+        if isinstance(run(), tuple):
+            raise RuntimeError('token verification failed against the fake realm')
+        yield run
+    finally:
+        token_cache.clear()
+        ctx.pop()
+
+@benchmark('auth.token_verify_uncached')
+def bench_token_verify_uncached(realm):
+    yield from _authenticated(realm, clear_cache=True)
+
+@benchmark('auth.token_verify_cached')
+def bench_token_verify_cached(realm):
+    yield from _authenticated(realm, clear_cache=False)
+
+def _find_all(realm, count, warm_urls):
+    app = make_app(realm, prescription_rows(count))
+    with app.app_context():
+        url_cache = app.minio_handler.url_cache
+
+        def run():
+            if not warm_urls:
+                url_cache.clear()
+            success, result = Prescription_Methods.findAllPrescriptions('user', limit=count)
+            if not success:
+                raise RuntimeError(result)
+            return result
+        yield run
+
+@benchmark('prescriptions.find_all_50')
+def bench_find_all_50(realm):
+    yield from _find_all(realm, 50, warm_urls=True)
+
+@benchmark('prescriptions.find_all_500')
+def bench_find_all_500(realm):
+    yield from _find_all(realm, 500, warm_urls=True)
+
+@benchmark('prescriptions.find_all_500_unsigned_urls')
+def bench_find_all_500_unsigned(realm):
+    yield from _find_all(realm, 500, warm_urls=False)
+
+VALIDATOR_INPUTS = {
+    'validate_pesel': ['44051401359', '02070803628', '12345678901', 'abc'],
+    'validate_email': ['jan.kowalski@example.com', 'not-an-email', 'a@b.pl'],
+    'validate_name': ['Kowalski', 'Żółć-Gęś', 'Robert); DROP TABLE'],
+    'validate_date': ['2024-01-31', '2024-02-30', 'yesterday'],
+    'validate_password': ['Str0ng!Passw0rd', 'weak', 'NoDigits!!!!'],
+    'sanitize_string': ['  <script>alert("x")</script>  ', 'Amoxicillin 500mg']
+}
+
+def _validator(method_name):
+    def setup(realm):
+        method = getattr(InputValidator, method_name)
+        inputs = VALIDATOR_INPUTS[method_name]
+
+        def run():
+            for value in inputs:
+                method(value)
+        yield run
+    return setup
+
+for _method_name in VALIDATOR_INPUTS:
+    benchmark(f'validation.{_method_name}')(_validator(_method_name))
+
+@benchmark('upload.validate_file_upload_1mb')
+def bench_validate_file_upload(realm):
+    app = make_app(realm)
+    pdf = b'%PDF-1.4\n' + b'0' * (1024 * 1024)
+
+    def run():
+        with app.test_request_context(
+            '/prescriptions', method='POST',
+            data={'pdf_file': (io.BytesIO(pdf), 'scan.pdf')},
+            content_type='multipart/form-data'
+        ):
+            if upload_view() is not None:
+                raise RuntimeError('upload rejected')
+    yield run
+
+@benchmark('serialization.jsonify_500')
+def bench_jsonify_500(realm):
+    app = make_app(realm, prescription_rows(500))
+    with app.app_context():
+        success, page = Prescription_Methods.findAllPrescriptions('user', limit=500)
+
+        def run():
+            return jsonify(page).get_data()
+        yield run
+
+def measure(run, rounds, min_round_time):
+    run()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_time:
+            break
+        number *= 2 if elapsed < min_round_time / 4 else 1 + int(min_round_time / max(elapsed, 1e-9))
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+    return {
+        'median_us': round(statistics.median(samples), 3),
+        'mean_us': round(statistics.fmean(samples), 3),
+        'min_us': round(min(samples), 3),
+        'stdev_us': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        'iterations': number,
+        'rounds': rounds
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run_benchmarks(names, rounds, min_round_time):
+    realm = FakeRealm()
+    results = {}
+    try:
+        for name in names:
+            setup = BENCHMARKS[name](realm)
+            run = next(setup)
+            try:
+                results[name] = measure(run, rounds, min_round_time)
+            finally:
+                setup.close()
+            print(f"{name:50} {results[name]['median_us']:>12.2f} us")
+    finally:
+        realm.close()
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rounds': rounds
+        },
+        'results': results
+    }
+
+def compare(current, baseline, threshold):
+    """Print median changes against a baseline run; return the names that regressed."""
+    regressions = []
+    print(f"\n{'benchmark':50} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before:
+            print(f"{name:50} {'-':>12} {result['median_us']:>12.2f}      new")
+            continue
+        change = result['median_us'] / before['median_us'] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:50} {before['median_us']:>12.2f} {result['median_us']:>12.2f} {change:>+8.1%}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this text')
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--min-round-time', type=float, default=0.05, help='seconds per measured round')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='baseline JSON from an earlier --output run')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative median slowdown reported as a regression')
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    report = run_benchmarks(names, args.rounds, args.min_round_time)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""End-to-end load test against a running backend seeded by benchmarks.seed_dataset.
+
+Tokens are signed by a local stand-in for the Keycloak realm, so the backend
+under test must fetch its keys from it:
+
+    KEYCLOAK_URL=http://<this host>:8089 RATE_LIMIT_ENABLED=false  # backend environment
+    python -m benchmarks.load_test --base-url http://localhost:5000 --duration 60 --concurrency 32
+
+Use the same --users and --seed as the seeding run so requests hit real data.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import date, datetime, timedelta, timezone
+import requests
+from benchmarks.fakes import FakeRealm
+from benchmarks.seed_dataset import user_ids, patients, medication, MEDICATIONS
+from benchmarks.hot_path import git_revision
+
+PDF = b'%PDF-1.4\n1 0 obj\n<< /Type /Catalog >>\nendobj\ntrailer\n<< /Root 1 0 R >>\n%%EOF\n' + b'0' * 64 * 1024
+
+DEFAULT_MIX = {
+    'list': 35,
+    'search_person': 15,
+    'search_medication': 10,
+    'upload': 5,
+    'delete': 5,
+    'notes_list': 15,
+    'notes_search': 5,
+    'notes_create': 10
+}
+
+class Client:
+    """One simulated user session: a keep-alive HTTP session and a token for one seeded account."""
+
+    def __init__(self, base_url, realm, user_index, user_id, seed, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f"Bearer {realm.token(sub=user_id, expires_in=24 * 3600)}"
+        self.patients = patients(user_index, seed)
+        self.timeout = timeout
+        self.created = deque(maxlen=100)
+        self.rng = random.Random()
+
+    def request(self, method, path, **kwargs):
+        return self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+
+    def list(self):
+        return self.request('GET', '/prescriptions', params={'limit': 50})
+
+    def search_person(self):
+        first_name, last_name, _ = self.rng.choice(self.patients)
+        return self.request('GET', '/prescriptions/search/person',
+                            params={'first_name': first_name, 'last_name': last_name, 'limit': 50})
+
+    def search_medication(self):
+        return self.request('GET', '/prescriptions/search/medication',
+                            params={'medication': self.rng.choice(MEDICATIONS), 'limit': 50})
+
+    def upload(self):
+        first_name, last_name, pesel = self.rng.choice(self.patients)
+        issue_date = date.today() - timedelta(days=self.rng.randrange(30))
+        response = self.request('POST', '/prescriptions', data={
+            'first_name': first_name,
+            'last_name': last_name,
+            'pesel': pesel,
+            'issue_date': issue_date.isoformat(),
+            'expiry_date': (issue_date + timedelta(days=30)).isoformat(),
+            'med_info_for_search': medication(self.rng)
+        }, files={'pdf_file': ('scan.pdf', PDF, 'application/pdf')})
+        if response.status_code == 201:
+            self.created.append(response.json()['prescription_id'])
+        return response
+
+    def delete(self):
+        if not self.created:
+            return None
+        return self.request('DELETE', f'/prescriptions/{self.created.popleft()}')
+
+    def notes_list(self):
+        return self.request('GET', '/notes', params={'view': 'summary', 'limit': 50})
+
+    def notes_search(self):
+        return self.request('GET', '/notes/search', params={'q': self.rng.choice(MEDICATIONS), 'limit': 50})
+
+    def notes_create(self):
+        return self.request('POST', '/notes', json={'name': 'Load test', 'content': medication(self.rng)})
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(samples, elapsed):
+    report = {}
+    for endpoint, entries in sorted(samples.items()):
+        latencies = sorted(latency for latency, _ in entries)
+        statuses = defaultdict(int)
+        for _, status in entries:
+            statuses[str(status)] += 1
+        report[endpoint] = {
+            'requests': len(entries),
+            'throughput_rps': round(len(entries) / elapsed, 2),
+            'errors': sum(1 for _, status in entries if status is None or status >= 500),
+            'statuses': dict(statuses),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 2)
+        }
+    return report
+
+def run(base_url, duration, concurrency, users, seed, mix, realm, timeout, warmup):
+    accounts = user_ids(users, seed)
+    scenarios = list(mix)
+    weights = [mix[name] for name in scenarios]
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    start = time.monotonic()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+
+    def worker(worker_index):
+        rng = random.Random(f"{seed}:{worker_index}")
+        user_index = rng.randrange(len(accounts))
+        client = Client(base_url, realm, user_index, accounts[user_index], seed, timeout)
+        local = defaultdict(list)
+        while time.monotonic() < deadline:
+            scenario = rng.choices(scenarios, weights)[0]
+            request_start = time.monotonic()
+            try:
+                response = getattr(client, scenario)()
+                if response is None:
+                    continue
+                status = response.status_code
+            except requests.RequestException:
+                status = None
+            if request_start >= measure_from:
+                local[scenario].append((time.monotonic() - request_start, status))
+        with lock:
+            for scenario, entries in local.items():
+                samples[scenario].extend(entries)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = max(time.monotonic() - measure_from, 1e-9)
+
+    report = summarize(samples, elapsed)
+    all_entries = [entry for entries in samples.values() for entry in entries]
+    report['total'] = summarize({'total': all_entries}, elapsed)['total'] if all_entries else {}
+    return report
+
+def print_report(report):
+    print(f"\n{'endpoint':20} {'requests':>9} {'req/s':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, row in report.items():
+        if not row:
+            continue
+        print(f"{endpoint:20} {row['requests']:>9} {row['throughput_rps']:>9.1f} {row['errors']:>7} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--duration', type=float, default=60, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds before measuring starts')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=5000, help='same value as the seeding run')
+    parser.add_argument('--seed', type=int, default=42, help='same value as the seeding run')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='weights, e.g. list=50,search_person=20,notes_list=30')
+    parser.add_argument('--realm-host', default='0.0.0.0')
+    parser.add_argument('--realm-port', type=int, default=8089)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    args = parser.parse_args(argv)
+
+    # a fresh kid makes the backend fetch this run's key instead of reusing a cached one
+    realm = FakeRealm(kid=f"load-test-{uuid.uuid4().hex[:8]}", host=args.realm_host, port=args.realm_port)
+    try:
+        report = run(args.base_url, args.duration, args.concurrency, args.users, args.seed,
+                     args.mix, realm, args.timeout, args.warmup)
+    finally:
+        realm.close()
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': datetime.now(timezone.utc).isoformat(),
+                    'git_revision': git_revision(),
+                    'python': platform.python_version(),
+                    'base_url': args.base_url,
+                    'duration': args.duration,
+                    'concurrency': args.concurrency,
+                    'users': args.users,
+                    'seed': args.seed,
+                    'mix': args.mix
+                },
+                'results': report
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
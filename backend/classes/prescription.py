@@ -1,217 +1,334 @@
 from flask import current_app
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, date
+import uuid
+import io
+import csv
+from psycopg2 import errors
+from utilities.pagination import Page, paginate, page_limit, NO_CURSOR, DEFAULT_PAGE_SIZE
+from utilities.db import Statement, execute, transaction
+from utilities.versions import bump_version
+from utilities.minio_handler import storage_available
+
+def pdf_url(object_key):
+    if not object_key or not current_app.minio_handler:
+        return None
+    return current_app.minio_handler.get_file_url(object_key)
+
+def remove_files(object_keys):
+    """Delete stored PDFs after their rows are gone; returns the number of objects that failed."""
+    object_keys = [key for key in object_keys if key]
+    if not object_keys:
+        return 0
+    if not storage_available():
+        current_app.logger.warning(f"Cannot delete {len(object_keys)} file(s) - MinIO unavailable")
+        return len(object_keys)
+    try:
+        return len(current_app.minio_handler.delete_files(object_keys))
+    except Exception as e:
+        # the rows are already committed; report the leftovers instead of failing the request
+        current_app.logger.error(f"Could not delete {len(object_keys)} file(s) from MinIO: {e}")
+        return len(object_keys)
+
+def storage_note(failed):
+    return f" ({failed} file(s) could not be removed from storage)" if failed else ""
+
+PRESCRIPTION_COLUMNS = """id, first_name, last_name, pesel,
+    issue_date, expiry_date, pdf_object_key, med_info_for_search"""
+
+# Date bounds used when the caller gives no range, so the statement text never changes
+NO_START_DATE = '-infinity'
+NO_END_DATE = 'infinity'
+
+INSERT_PRESCRIPTION = Statement('prescriptions_insert', """
+    INSERT INTO prescriptions
+    (user_id, first_name, last_name, pesel, issue_date, expiry_date, pdf_object_key, med_info_for_search)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    RETURNING id
+""", 8)
+
+LIST_PRESCRIPTIONS = Statement('prescriptions_list', f"""
+    SELECT {PRESCRIPTION_COLUMNS}
+    FROM prescriptions
+    WHERE user_id = $1 AND (issue_date, id) < ($2, $3)
+    ORDER BY issue_date DESC, id DESC
+    LIMIT $4
+""", 4)
+
+FIND_BY_PERSON = Statement('prescriptions_by_person', f"""
+    SELECT {PRESCRIPTION_COLUMNS}
+    FROM prescriptions
+    WHERE user_id = $1 AND last_name = $2 AND first_name = $3
+    AND issue_date >= $4 AND issue_date <= $5
+    AND (issue_date, id) < ($6, $7)
+    ORDER BY issue_date DESC, id DESC
+    LIMIT $8
+""", 8)
+
+FIND_BY_MEDICATION = Statement('prescriptions_by_medication', f"""
+    SELECT {PRESCRIPTION_COLUMNS}
+    FROM prescriptions, websearch_to_tsquery('simple', $1) AS tsq
+    WHERE user_id = $2
+    AND (med_info_tsv @@ tsq OR med_info_for_search ILIKE $3)
+    AND (issue_date, id) < ($4, $5)
+    ORDER BY issue_date DESC, id DESC
+    LIMIT $6
+""", 6)
+
+FIND_BY_MEDICATION_RELEVANCE = Statement('prescriptions_by_medication_relevance', f"""
+    SELECT {PRESCRIPTION_COLUMNS}
+    FROM prescriptions, websearch_to_tsquery('simple', $1) AS tsq
+    WHERE user_id = $2
+    AND (med_info_tsv @@ tsq OR med_info_for_search ILIKE $3)
+    ORDER BY ts_rank_cd(med_info_tsv, tsq) + similarity(med_info_for_search, $1) DESC,
+        issue_date DESC, id DESC
+    LIMIT $4
+""", 4)
+
+GET_PRESCRIPTION = Statement('prescriptions_get', f"""
+    SELECT {PRESCRIPTION_COLUMNS}
+    FROM prescriptions
+    WHERE id = $1 AND user_id = $2
+""", 2)
+
+DELETE_PRESCRIPTION = Statement('prescriptions_delete', """
+    DELETE FROM prescriptions
+    WHERE id = $1 AND user_id = $2
+    RETURNING id, pdf_object_key
+""", 2)
+
+DELETE_BY_NAME = Statement('prescriptions_delete_by_name', """
+    DELETE FROM prescriptions
+    WHERE user_id = $1 AND first_name = $2 AND last_name = $3
+    RETURNING id, pdf_object_key
+""", 3)
+
+DELETE_EXPIRED = Statement('prescriptions_delete_expired', """
+    DELETE FROM prescriptions
+    WHERE user_id = $1 AND expiry_date < $2
+    RETURNING id, pdf_object_key
+""", 2)
+
+@dataclass
+class PrescriptionItem:
+    """One row of a prescription list, serialized by orjson without an intermediate dict.
+
+    Not slotted on purpose: orjson reads a dataclass __dict__ directly but
+    falls back to a much slower path for __slots__ instances.
+    """
+    id: int
+    first_name: str
+    last_name: str
+    pesel: str
+    issue_date: date
+    expiry_date: date
+    pdf_url: str
+    med_info: str
+
+@dataclass
+class PrescriptionDetail:
+    id: int
+    user_id: str
+    first_name: str
+    last_name: str
+    pesel: str
+    issue_date: date
+    expiry_date: date
+    pdf_url: str
+    med_info_for_search: str
+
+def prescription_item(row):
+    return PrescriptionItem(row[0], row[1], row[2], row[3], row[4], row[5], pdf_url(row[6]), row[7])
+
+def prescription_page(rows, limit):
+    rows, next_cursor = paginate(rows, limit, lambda row: (row[4], row[0]))
+    return Page([prescription_item(row) for row in rows], next_cursor)
 
 class Prescription_Methods:
     @staticmethod
-    def DeleteByName(user_id, first_name, last_name):
-        conn = None
-        cur = None
+    def addPrescription(user_id, first_name, last_name, pesel, issue_date, expiry_date, pdf_object_key, med_info):
+        try:
+            with transaction() as cur:
+                execute(cur, INSERT_PRESCRIPTION, (
+                    user_id, first_name, last_name, pesel, issue_date, expiry_date, pdf_object_key, med_info
+                ))
+                prescription_id = cur.fetchone()[0]
+                bump_version(cur, user_id, 'prescriptions')
+            return True, prescription_id
+        except errors.UniqueViolation:
+            return False, "File is already attached to a prescription"
+        except Exception as e:
+            return False, f"Error adding prescription: {str(e)}"
 
+    @staticmethod
+    def bulkInsertPrescriptions(user_id, rows, batch_size: int = 5000):
+        """COPY validated (first_name, last_name, pesel, issue_date, expiry_date, med_info) rows in one transaction."""
         try:
-            conn = current_app.db_pool.getconn()
-            cur = conn.cursor()
-            
-            cur.execute("""
-                DELETE FROM prescriptions 
-                WHERE user_id = %s 
-                AND first_name = %s 
-                AND last_name = %s
-                RETURNING id
-            """, (user_id, first_name, last_name))
-            
-            deleted = cur.fetchall()
-            conn.commit()
+            with transaction() as cur:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for start in range(0, len(rows), batch_size):
+                    buffer.seek(0)
+                    buffer.truncate()
+                    writer.writerows((user_id,) + tuple(row) for row in rows[start:start + batch_size])
+                    buffer.seek(0)
+                    cur.copy_expert("""
+                        COPY prescriptions
+                        (user_id, first_name, last_name, pesel, issue_date, expiry_date, med_info_for_search)
+                        FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (med_info_for_search))
+                    """, buffer)
+                bump_version(cur, user_id, 'prescriptions')
+            return True, len(rows)
+        except Exception as e:
+            return False, f"Error importing prescriptions: {str(e)}"
+
+    @staticmethod
+    def getPrescription(user_id, prescription_id):
+        try:
+            with transaction() as cur:
+                execute(cur, GET_PRESCRIPTION, (prescription_id, user_id))
+                row = cur.fetchone()
+            if not row:
+                return False, "Prescription not found"
+            return True, PrescriptionDetail(row[0], user_id, row[1], row[2], row[3], row[4], row[5],
+                                            pdf_url(row[6]), row[7])
+        except Exception as e:
+            return False, f"Error fetching prescription: {str(e)}"
+
+    @staticmethod
+    def deletePrescription(user_id, prescription_id):
+        try:
+            with transaction() as cur:
+                execute(cur, DELETE_PRESCRIPTION, (prescription_id, user_id))
+                deleted = cur.fetchone()
+                if deleted:
+                    bump_version(cur, user_id, 'prescriptions')
+            if not deleted:
+                return False, "Prescription not found"
+
+            failed = remove_files([deleted[1]])
+            return True, "Prescription deleted successfully" + storage_note(failed)
+        except Exception as e:
+            return False, f"Error deleting prescription: {str(e)}"
+
+    @staticmethod
+    def DeleteByName(user_id, first_name, last_name):
+        try:
+            with transaction() as cur:
+                execute(cur, DELETE_BY_NAME, (user_id, first_name, last_name))
+                deleted = cur.fetchall()
+                if deleted:
+                    bump_version(cur, user_id, 'prescriptions')
             if not deleted:
                 return False, "No matching prescriptions found"
-                
-            return True, f"Successfully deleted {len(deleted)} prescription(s)"
+
+            failed = remove_files(row[1] for row in deleted)
+            return True, f"Successfully deleted {len(deleted)} prescription(s)" + storage_note(failed)
         except Exception as e:
-            if conn:
-                conn.rollback()
             return False, f"Error deleting prescriptions: {str(e)}"
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                current_app.db_pool.putconn(conn)
 
     @staticmethod
-    def findPrescriptionsByPerson(user_id, first_name, last_name, start_date = None, end_date = None):
-        conn = None
-        cur = None
-        
+    def findPrescriptionsByPerson(user_id, first_name, last_name, start_date = None, end_date = None, limit = DEFAULT_PAGE_SIZE, cursor = None):
         try:
-            conn = current_app.db_pool.getconn()
-            cur = conn.cursor()
-            
-            query = """
-                SELECT id, first_name, last_name, pesel, 
-                    issue_date, expiry_date, pdf_url, med_info_for_search
-                FROM prescriptions 
-                WHERE user_id = %s 
-                AND first_name = %s 
-                AND last_name = %s
-            """
-            params = [user_id, first_name, last_name]
-            
-            if start_date:
-                query += " AND issue_date >= %s"
-                params.append(start_date)
-            if end_date:
-                query += " AND issue_date <= %s"
-                params.append(end_date)
-                
-            query += " ORDER BY issue_date DESC"
-            
-            cur.execute(query, tuple(params))
-            prescriptions = cur.fetchall()
-            
-            if not prescriptions:
+            with transaction() as cur:
+                execute(cur, FIND_BY_PERSON, (
+                    user_id, last_name, first_name,
+                    start_date or NO_START_DATE, end_date or NO_END_DATE,
+                    *(cursor or NO_CURSOR), page_limit(limit)
+                ))
+                rows = cur.fetchall()
+
+            if not rows and not cursor:
                 return False, "No matching prescriptions found"
-                
-            result = [{
-                'id': p[0],
-                'first_name': p[1],
-                'last_name': p[2],
-                'pesel': p[3],
-                'issue_date': p[4].strftime('%Y-%m-%d'),
-                'expiry_date': p[5].strftime('%Y-%m-%d'),
-                'pdf_url': p[6],
-                'med_info': p[7]
-            } for p in prescriptions]
-            
-            return True, result
-            
+            return True, prescription_page(rows, limit)
+
         except Exception as e:
             return False, f"Error finding prescriptions: {str(e)}"
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                current_app.db_pool.putconn(conn)
 
     @staticmethod
-    def findByMedication(user_id, med_pattern):
-        conn = None
-        cur = None
+    def findByMedication(user_id, med_pattern, limit = DEFAULT_PAGE_SIZE, cursor = None, sort = 'date'):
+        escaped = med_pattern.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        search_pattern = f'%{escaped}%'
+        limit = limit or DEFAULT_PAGE_SIZE
         try:
-            conn = current_app.db_pool.getconn()
-            cur = conn.cursor()
-            
-            query = """
-                SELECT id, first_name, last_name, pesel, 
-                    issue_date, expiry_date, pdf_url, med_info_for_search
-                FROM prescriptions 
-                WHERE user_id = %s 
-                AND med_info_for_search ILIKE %s
-                ORDER BY issue_date DESC
-            """
-            search_pattern = f'%{med_pattern}%'
-            
-            cur.execute(query, (user_id, search_pattern))
-            prescriptions = cur.fetchall()
-            
-            if not prescriptions:
+            with transaction() as cur:
+                if sort == 'relevance':
+                    execute(cur, FIND_BY_MEDICATION_RELEVANCE, (
+                        med_pattern, user_id, search_pattern, limit
+                    ))
+                    rows, limit = cur.fetchall(), None
+                else:
+                    execute(cur, FIND_BY_MEDICATION, (
+                        med_pattern, user_id, search_pattern, *(cursor or NO_CURSOR), page_limit(limit)
+                    ))
+                    rows = cur.fetchall()
+
+            if not rows and not cursor:
                 return False, "No prescriptions found with this medication"
-                
-            result = [{
-                'id': p[0],
-                'first_name': p[1],
-                'last_name': p[2],
-                'pesel': p[3],
-                'issue_date': p[4].strftime('%Y-%m-%d'),
-                'expiry_date': p[5].strftime('%Y-%m-%d'),
-                'pdf_url': p[6],
-                'med_info': p[7]
-            } for p in prescriptions]
-            
-            return True, result
-            
+            return True, prescription_page(rows, limit)
+
         except Exception as e:
             return False, f"Error searching prescriptions: {str(e)}"
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                current_app.db_pool.putconn(conn)
 
     @staticmethod
     def deletePrescriptionsByDate(user_id: int, before_date: str = None):
-        conn = None
-        cur = None
-        
+        if not before_date:
+            before_date = datetime.now().strftime('%Y-%m-%d')
         try:
-            conn = current_app.db_pool.getconn()
-            cur = conn.cursor()
-            
-            if not before_date:
-                before_date = datetime.now().strftime('%Y-%m-%d')
-                
-            query = """
-                DELETE FROM prescriptions 
-                WHERE user_id = %s 
-                AND expiry_date < %s
-                RETURNING id
-            """
-            
-            cur.execute(query, (user_id, before_date))
-            deleted = cur.fetchall()
-            conn.commit()
-            
+            with transaction() as cur:
+                execute(cur, DELETE_EXPIRED, (user_id, before_date))
+                deleted = cur.fetchall()
+                if deleted:
+                    bump_version(cur, user_id, 'prescriptions')
+
             if not deleted:
                 return False, "No expired prescriptions found"
-                
-            return True, f"Successfully deleted {len(deleted)} expired prescription(s)"
-            
+
+            failed = remove_files(row[1] for row in deleted)
+            return True, f"Successfully deleted {len(deleted)} expired prescription(s)" + storage_note(failed)
+
         except Exception as e:
-            if conn:
-                conn.rollback()
             return False, f"Error deleting expired prescriptions: {str(e)}"
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                current_app.db_pool.putconn(conn)
-    
+
     @staticmethod
-    def findAllPrescriptions(user_id: int):
-        conn = None
-        cur = None
+    def findAllPrescriptions(user_id: int, limit: int = DEFAULT_PAGE_SIZE, cursor: list = None):
         try:
-            conn = current_app.db_pool.getconn()
-            cur = conn.cursor()
-            
-            query = """
-                SELECT id, first_name, last_name, pesel, 
-                    issue_date, expiry_date, pdf_url, med_info_for_search
-                FROM prescriptions 
-                WHERE user_id = %s
-                ORDER BY issue_date DESC
-            """
-            
-            cur.execute(query, (user_id,))
-            prescriptions = cur.fetchall()
-            
-            if not prescriptions:
+            with transaction() as cur:
+                execute(cur, LIST_PRESCRIPTIONS, (user_id, *(cursor or NO_CURSOR), page_limit(limit)))
+                rows = cur.fetchall()
+
+            if not rows and not cursor:
                 return False, "No prescriptions found for this user"
-                
-            result = [{
-                'id': p[0],
-                'first_name': p[1],
-                'last_name': p[2],
-                'pesel': p[3],
-                'issue_date': p[4].strftime('%Y-%m-%d'),
-                'expiry_date': p[5].strftime('%Y-%m-%d'),
-                'pdf_url': p[6],
-                'med_info': p[7]
-            } for p in prescriptions]
-            
-            return True, result
-            
+            return True, prescription_page(rows, limit)
+
         except Exception as e:
             return False, f"Error fetching prescriptions: {str(e)}"
+
+    @staticmethod
+    def iterPrescriptions(user_id, chunk_size: int = 1000):
+        """Yield the user's prescriptions in chunks from a server-side cursor."""
+        pool = current_app.db_pool
+        conn = pool.getconn()
+        cur = None
+        try:
+            cur = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+            cur.itersize = chunk_size
+            cur.execute("""
+                SELECT id, first_name, last_name, pesel,
+                    issue_date, expiry_date, pdf_object_key, med_info_for_search
+                FROM prescriptions
+                WHERE user_id = %s
+                ORDER BY issue_date DESC, id DESC
+            """, (user_id,))
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
         finally:
-            if cur:
-                cur.close()
-            if conn:
-                current_app.db_pool.putconn(conn)
\ No newline at end of file
+            # putconn rolls back the open transaction, or discards the connection if it broke
+            try:
+                if cur:
+                    cur.close()
+            finally:
+                pool.putconn(conn)
@@ -24,6 +24,37 @@ CREATE TABLE IF NOT EXISTS doctors (
     specialty VARCHAR(255),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
-CREATE INDEX IF NOT EXISTS idx_prescriptions_user_id ON prescriptions(user_id);
-CREATE INDEX IF NOT EXISTS idx_notes_user_id ON notes(user_id);
+ALTER TABLE prescriptions ADD COLUMN IF NOT EXISTS pdf_object_key TEXT;
+UPDATE prescriptions
+SET pdf_object_key = substring(pdf_url from '(prescriptions/[^/?]+/[^/?]+)(\?|$)')
+WHERE pdf_object_key IS NULL AND pdf_url IS NOT NULL;
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    tat DOUBLE PRECISION NOT NULL
+);
+DROP INDEX IF EXISTS idx_prescriptions_user_id;
+CREATE INDEX IF NOT EXISTS idx_prescriptions_user_issue ON prescriptions(user_id, issue_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_user_person ON prescriptions(user_id, last_name, first_name, issue_date DESC, id DESC);
+-- one row per stored PDF; deleting a row removes its object
+CREATE UNIQUE INDEX IF NOT EXISTS idx_prescriptions_pdf_object_key ON prescriptions(pdf_object_key) WHERE pdf_object_key IS NOT NULL;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+ALTER TABLE prescriptions ADD COLUMN IF NOT EXISTS med_info_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', coalesce(med_info_for_search, ''))) STORED;
+CREATE INDEX IF NOT EXISTS idx_prescriptions_med_trgm ON prescriptions USING GIN (user_id, med_info_for_search gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_med_tsv ON prescriptions USING GIN (user_id, med_info_tsv);
 CREATE INDEX IF NOT EXISTS idx_doctors_user_id ON doctors(user_id);
+CREATE TABLE IF NOT EXISTS user_data_versions (
+    user_id UUID NOT NULL,
+    resource VARCHAR(32) NOT NULL,
+    version BIGINT NOT NULL,
+    PRIMARY KEY (user_id, resource)
+);
+ALTER TABLE notes ADD COLUMN IF NOT EXISTS note_title TEXT
+    GENERATED ALWAYS AS (note_name->>'name') STORED;
+ALTER TABLE notes ADD COLUMN IF NOT EXISTS note_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple',
+        coalesce(note_name->>'name', '') || ' ' || coalesce(note_name->>'content', ''))) STORED;
+DROP INDEX IF EXISTS idx_notes_user_id;
+CREATE INDEX IF NOT EXISTS idx_notes_user_created ON notes(user_id, created_at DESC, id DESC) INCLUDE (note_title);
+CREATE INDEX IF NOT EXISTS idx_notes_tsv ON notes USING GIN (user_id, note_tsv);
@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import pathlib
+import shutil
+import threading
+import time
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+
+# gthread serves the REST API; set GUNICORN_WORKER_CLASS=gevent or eventlet
+# (and install it) when Flask-SocketIO websockets are needed.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# Per-process rate limit buckets would multiply every limit by the worker count
+if workers > 1:
+    os.environ.setdefault('RATE_LIMIT_BACKEND', 'postgres')
+
+# Workers share logs/app.log; only the master rotates it (see when_ready)
+os.environ['LOG_ROTATION'] = 'external'
+
+# DB_POOL_TOTAL is the connection budget for the whole container, split evenly between workers
+if 'DB_POOL_MAX' not in os.environ:
+    os.environ['DB_POOL_MAX'] = str(max(1, int(os.getenv('DB_POOL_TOTAL', 40)) // workers))
+
+# Workers share metrics through files; start every run with an empty directory
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/datamed-metrics')
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+# Profiles are files too, so /admin/profiles sees every worker's; ids embed the pid
+os.environ.setdefault('PROFILING_DIR', '/tmp/datamed-profiles')
+shutil.rmtree(os.environ['PROFILING_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROFILING_DIR'], exist_ok=True)
+
+key_file = "./klucz_bez_hasla.key"
+cert_file = "./certyfikat.crt"
+if pathlib.Path(key_file).exists() and pathlib.Path(cert_file).exists():
+    keyfile = key_file
+    certfile = cert_file
+
+def when_ready(server):
+    from logger import rotate_log
+
+    def rotate_forever():
+        while True:
+            time.sleep(30)
+            try:
+                rotate_log()
+            except OSError as e:
+                server.log.warning(f"Log rotation failed: {e}")
+
+    threading.Thread(target=rotate_forever, name='log-rotation', daemon=True).start()
+
+def pre_fork(server, worker):
+    # Workers must not inherit database or MinIO sockets opened while preloading
+    if preload_app:
+        app = server.app.wsgi()
+        app.db_pool.clear()
+        if app.minio_handler:
+            app.minio_handler.after_fork()
+
+def worker_exit(server, worker):
+    pool = getattr(getattr(worker, 'wsgi', None), 'db_pool', None)
+    if pool is not None and not pool.closed:
+        pool.closeall()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,42 +1,168 @@
 from flask import request, current_app
-from time import time
+from time import perf_counter
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, WatchedFileHandler, QueueHandler, QueueListener
+import atexit
+import json
 import os
+import queue
+import re
+import uuid
+from utilities.metrics import HTTP_REQUEST_SECONDS, HTTP_RESPONSE_BYTES
+from utilities.timing import begin_request, end_request
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,128}$')
+
+LOG_FILE = 'logs/app.log'
+LOG_MAX_BYTES = 10485760
+LOG_BACKUP_COUNT = 5
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, default=str)
+
+class LogQueue:
+    """Hands log records to a background thread so file I/O never blocks a request."""
+
+    def __init__(self, *handlers):
+        self.queue = queue.SimpleQueue()
+        self.handlers = handlers
+        self.listener = None
+        self.start()
+        atexit.register(self.stop)
+        # threads do not survive fork; gunicorn workers need their own listener
+        os.register_at_fork(after_in_child=self.start)
+
+    def start(self):
+        self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+
+_log_queue = None
+
+def setup_logging():
+    global _log_queue
+    logger = logging.getLogger('app')
+    if _log_queue is None:
+        if not os.path.exists('logs'):
+            os.makedirs('logs')
+
+        if os.getenv('LOG_ROTATION') == 'external':
+            # several processes append to the file; one of them rotates it with rotate_log()
+            handler = WatchedFileHandler(LOG_FILE)
+        else:
+            handler = RotatingFileHandler(
+                LOG_FILE,
+                maxBytes=LOG_MAX_BYTES,
+                backupCount=LOG_BACKUP_COUNT
+            )
+        handler.setFormatter(JsonFormatter())
+
+        _log_queue = LogQueue(handler)
+        logger.addHandler(QueueHandler(_log_queue.queue))
+        logger.setLevel(logging.INFO)
+    return logger
+
+def rotate_log(path=LOG_FILE, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+    """Rename path to path.1 (shifting older backups) once it reaches max_bytes.
+
+    Writers using WatchedFileHandler notice the rename and reopen path.
+    """
+    try:
+        if os.path.getsize(path) < max_bytes:
+            return False
+    except FileNotFoundError:
+        return False
+    for index in range(backup_count - 1, 0, -1):
+        if os.path.exists(f"{path}.{index}"):
+            os.replace(f"{path}.{index}", f"{path}.{index + 1}")
+    os.replace(path, f"{path}.1")
+    return True
+
+class ObservedResponse:
+    """Wraps the response iterable so the request is recorded once the server closes it."""
+
+    def __init__(self, body, on_close):
+        self._body = body
+        self._on_close = on_close
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self._body:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._on_close(self.size)
 
 class RequestLoggingMiddleware:
     def __init__(self, wsgi_app):
         self.wsgi_app = wsgi_app
-        
-        if not os.path.exists('logs'):
-            os.makedirs('logs')
-            
-        handler = RotatingFileHandler(
-            'logs/app.log',
-            maxBytes=10485760,
-            backupCount=5
-        )
-        
-        formatter = logging.Formatter(
-            '[%(asctime)s] %(levelname)s - %(message)s'
-        )
-        handler.setFormatter(formatter)
-        
-        self.logger = logging.getLogger('app')
-        self.logger.addHandler(handler)
-        self.logger.setLevel(logging.INFO)
+        self.logger = setup_logging()
 
     def __call__(self, environ, start_response):
-        path = environ.get('PATH_INFO')
-        method = environ.get('REQUEST_METHOD')
-        start_time = time()
-        
+        start_time = perf_counter()
+        timings = begin_request()
+        request_id = environ.get('HTTP_X_REQUEST_ID', '')
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        environ['datamed.request_id'] = request_id
+        labels = {'status': '500', 'route': 'unmatched'}
+
         def logging_start_response(status, headers, *args):
-            duration = time() - start_time
-            status_code = int(status.split()[0])
-            self.logger.info(
-                f'{method} {path} {status_code} - {duration:.2f}s'
-            )
+            labels['status'] = status.split(' ', 1)[0]
+            # Flask drops the request from the environ once the response is returned,
+            # so read the matched rule now. The rule, not the raw path, keeps ids out of labels.
+            url_rule = getattr(environ.get('werkzeug.request'), 'url_rule', None)
+            if url_rule is not None:
+                labels['route'] = url_rule.rule
+            headers.append(('X-Request-ID', request_id))
             return start_response(status, headers, *args)
-            
-        return self.wsgi_app(environ, logging_start_response)
\ No newline at end of file
+
+        def record(size):
+            end_request()
+            self.record(environ, labels['route'], labels['status'], perf_counter() - start_time, size, timings)
+
+        try:
+            body = self.wsgi_app(environ, logging_start_response)
+        except Exception:
+            record(0)
+            raise
+        return ObservedResponse(body, record)
+
+    def record(self, environ, route, status_code, duration, size, timings):
+        method = environ.get('REQUEST_METHOD')
+        HTTP_REQUEST_SECONDS.labels(method, route, status_code).observe(duration)
+        HTTP_RESPONSE_BYTES.labels(method, route, status_code).observe(size)
+        self.logger.info(
+            f'{method} {route} {status_code}',
+            extra={'fields': {
+                'request_id': environ['datamed.request_id'],
+                'user_id': environ.get('datamed.user_id'),
+                'method': method,
+                'path': environ.get('PATH_INFO'),
+                'route': route,
+                'status': int(status_code),
+                'remote_addr': environ.get('REMOTE_ADDR'),
+                'duration_ms': round(duration * 1000, 2),
+                'db_ms': round(timings.get('db', 0.0) * 1000, 2),
+                'storage_ms': round(timings.get('minio', 0.0) * 1000, 2),
+                'keycloak_ms': round(timings.get('keycloak', 0.0) * 1000, 2),
+                'response_bytes': size
+            }}
+        )
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the unit tests import utilities/, classes/ and benchmarks/ the way the backend runs them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the container check needs docker-compose; it runs through run_tests.sh or unittest
+collect_ignore = ['test_containers.py']
@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+import psycopg2
+import pytest
+from psycopg2 import extensions
+from benchmarks.fakes import FakeConnection
+from psycopg2.pool import PoolError
+from utilities.db_pool import BlockingConnectionPool, PoolTimeout
+
+class FakeConnectingPool(BlockingConnectionPool):
+    """BlockingConnectionPool that hands out FakeConnections instead of dialling PostgreSQL."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.opened = []
+        self.refuse = False
+
+    def _connect(self):
+        if self.refuse:
+            raise psycopg2.OperationalError('connection refused')
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+class FakeReconnector:
+    def __init__(self):
+        self.marked_down = 0
+
+    def mark_down(self):
+        self.marked_down += 1
+
+def make_pool(**kwargs):
+    kwargs.setdefault('acquire_timeout', 0.05)
+    return FakeConnectingPool(kwargs.pop('minconn', 0), kwargs.pop('maxconn', 1), **kwargs)
+
+def test_connects_lazily_and_fill_opens_minconn():
+    pool = make_pool(minconn=2, maxconn=3)
+    assert pool.opened == []
+    pool.fill()
+    assert len(pool.opened) == 2
+    assert pool.stats() == {'in_use': 0, 'idle': 2, 'waiting': 0, 'max': 3}
+
+def test_getconn_times_out_when_exhausted():
+    pool = make_pool()
+    conn = pool.getconn()
+    start = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert time.monotonic() - start >= 0.05
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+
+def test_waiter_gets_connection_released_by_another_thread():
+    pool = make_pool(acquire_timeout=2)
+    conn = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    time.sleep(0.05)
+    assert pool.stats()['waiting'] == 1
+    pool.putconn(conn)
+    waiter.join(1)
+    assert got == [conn]
+
+def test_returned_connection_is_reused():
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert len(pool.opened) == 1
+
+def test_connection_past_max_age_is_recycled_on_checkout():
+    pool = make_pool(max_age=60)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.created_at -= 61
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.stats()['in_use'] == 1
+
+def test_connection_past_max_age_is_closed_on_return():
+    pool = make_pool(max_age=60)
+    conn = pool.getconn()
+    conn.created_at -= 61
+    pool.putconn(conn)
+    assert conn.closed
+    assert pool.stats()['idle'] == 0
+    assert pool.getconn() is not conn
+
+def test_idle_connection_is_validated_and_replaced_when_broken():
+    pool = make_pool(validate_after=30)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.last_used -= 31
+    conn.broken = True
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert conn.closed
+
+def test_connection_returned_in_transaction_is_rolled_back_not_reset():
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.prepared_statements.add('prescriptions_list')
+    conn.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+    assert conn.calls == ['rollback']
+    assert conn.prepared_statements == {'prescriptions_list'}
+
+def test_connection_with_changed_session_settings_is_reset():
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.prepared_statements.add('prescriptions_list')
+    conn.autocommit = True
+    pool.putconn(conn)
+    assert conn.calls == ['reset']
+    assert conn.prepared_statements == set()
+    assert pool.getconn().autocommit is False
+
+def test_idle_connection_is_returned_untouched():
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert conn.calls == []
+
+def test_connection_in_unknown_state_is_discarded():
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.info.transaction_status = extensions.TRANSACTION_STATUS_UNKNOWN
+    pool.putconn(conn)
+    assert conn.closed
+    assert pool.stats()['idle'] == 0
+
+def test_closed_connection_reports_outage():
+    pool = make_pool()
+    pool.connection = FakeReconnector()
+    conn = pool.getconn()
+    conn.closed = 2
+    pool.putconn(conn)
+    assert pool.connection.marked_down == 1
+    assert pool.stats()['idle'] == 0
+
+def test_failed_connect_frees_the_slot_and_reports_outage():
+    pool = make_pool()
+    pool.connection = FakeReconnector()
+    pool.refuse = True
+    with pytest.raises(psycopg2.OperationalError):
+        pool.getconn()
+    assert pool.connection.marked_down == 1
+    pool.refuse = False
+    assert pool.getconn() is not None
+
+def test_putconn_rejects_foreign_connection():
+    pool = make_pool()
+    with pytest.raises(PoolError):
+        pool.putconn(FakeConnection())
+
+def test_closeall_closes_idle_and_used_connections():
+    pool = make_pool(maxconn=2)
+    used = pool.getconn()
+    idle = pool.getconn()
+    pool.putconn(idle)
+    pool.closeall()
+    assert used.closed and idle.closed
+    with pytest.raises(PoolError):
+        pool.getconn()
+
+def test_forked_child_starts_with_an_empty_unlocked_pool():
+    pool = make_pool()
+    inherited = pool.getconn()
+    with pool._cond:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                conn = pool.getconn()
+                os._exit(0 if conn is not inherited and not inherited.closed else 1)
+            except BaseException:
+                os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
@@ -0,0 +1,90 @@
+from datetime import date, datetime, timezone
+import base64
+import json
+import pytest
+from flask import Flask
+from werkzeug.datastructures import MultiDict
+from benchmarks.fakes import prescription_rows
+from utilities.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, Page, decode_cursor, encode_cursor,
+    page_limit, page_response, paginate, parse_page_args
+)
+
+def raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).rstrip(b'=').decode('ascii')
+
+def test_cursor_round_trips_dates_and_timestamps():
+    created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor(date(2024, 1, 31), 7), 2) == ['2024-01-31', 7]
+    assert decode_cursor(encode_cursor(created_at, 8), 2) == [created_at.isoformat(), 8]
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor(date(2024, 1, 31), 123456)
+    assert '=' not in cursor and '+' not in cursor and '/' not in cursor
+
+@pytest.mark.parametrize('cursor', [
+    'not base64 at all!',
+    raw_cursor({'date': '2024-01-01', 'id': 1}),
+    raw_cursor(['2024-01-01']),
+    raw_cursor(['2024-01-01', 1, 2]),
+    raw_cursor(['x', 1]),
+    raw_cursor([{'a': 1}, 1]),
+    raw_cursor([20240101, 1]),
+    raw_cursor(['2024-01-01', '1']),
+    raw_cursor(['2024-01-01', 1.5]),
+    raw_cursor(['2024-01-01', True]),
+    raw_cursor(['2024-01-01', 2 ** 31]),
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 2)
+
+def test_limit_defaults_to_page_size():
+    assert parse_page_args(MultiDict()) == (DEFAULT_PAGE_SIZE, None)
+
+def test_limit_and_cursor_are_parsed():
+    cursor = encode_cursor(date(2024, 1, 31), 7)
+    assert parse_page_args(MultiDict({'limit': '10', 'cursor': cursor})) == (10, ['2024-01-31', 7])
+
+@pytest.mark.parametrize('limit', ['0', '-1', str(MAX_PAGE_SIZE + 1), 'ten'])
+def test_out_of_range_limit_is_rejected(limit):
+    with pytest.raises(ValueError):
+        parse_page_args(MultiDict({'limit': limit}))
+
+def test_page_limit_fetches_one_extra_row():
+    assert page_limit(50) == 51
+    assert page_limit(None) is None
+
+def test_paginate_trims_to_limit_and_points_at_last_row():
+    rows = prescription_rows(5)
+    page, next_cursor = paginate(rows, 4, lambda row: (row[4], row[0]))
+    assert page == rows[:4]
+    assert decode_cursor(next_cursor, 2) == [rows[3][4].isoformat(), rows[3][0]]
+
+def test_paginate_last_page_has_no_cursor():
+    rows = prescription_rows(4)
+    assert paginate(rows, 4, lambda row: (row[4], row[0])) == (rows, None)
+    assert paginate(rows, None, lambda row: (row[4], row[0])) == (rows, None)
+
+def test_keyset_pages_cover_every_row_once():
+    rows = prescription_rows(23)
+    seen = []
+    cursor = None
+    while True:
+        # what the keyset WHERE clause does: rows strictly after the cursor in (date, id) DESC order
+        remaining = [row for row in rows
+                     if cursor is None or (row[4].isoformat(), row[0]) < (cursor[0], cursor[1])]
+        page, next_cursor = paginate(remaining[:page_limit(10)], 10, lambda row: (row[4], row[0]))
+        seen.extend(row[0] for row in page)
+        if next_cursor is None:
+            break
+        cursor = decode_cursor(next_cursor, 2)
+    assert seen == [row[0] for row in rows]
+
+def test_page_response_sets_next_cursor_header():
+    app = Flask(__name__)
+    with app.app_context():
+        response = page_response(Page([1, 2], 'abc'))
+        assert response.get_json() == [1, 2]
+        assert response.headers['X-Next-Cursor'] == 'abc'
+        assert 'X-Next-Cursor' not in page_response(Page([1])).headers
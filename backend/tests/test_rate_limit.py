@@ -0,0 +1,105 @@
+import pytest
+from flask import Flask
+from benchmarks.fakes import FakePool
+from utilities import rate_limit
+from utilities.rate_limit import MemoryRateLimitBackend, PostgresRateLimitBackend, create_backend
+from utilities.security_utils import rate_limit_decorator
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock)
+    return clock
+
+def test_burst_of_tolerance_plus_one_then_limited(clock):
+    backend = MemoryRateLimitBackend()
+    # 3 requests per 3 seconds: emission 1s, tolerance 2s
+    assert [backend.allow('k', 1.0, 2.0)[0] for _ in range(4)] == [True, True, True, False]
+
+def test_retry_after_is_time_until_next_token(clock):
+    backend = MemoryRateLimitBackend()
+    for _ in range(3):
+        backend.allow('k', 1.0, 2.0)
+    clock.now += 0.25
+    allowed, retry_after = backend.allow('k', 1.0, 2.0)
+    assert not allowed
+    assert retry_after == pytest.approx(0.75)
+
+def test_tokens_refill_at_the_emission_rate(clock):
+    backend = MemoryRateLimitBackend()
+    for _ in range(3):
+        backend.allow('k', 1.0, 2.0)
+    clock.now += 1.0
+    assert backend.allow('k', 1.0, 2.0)[0]
+    assert not backend.allow('k', 1.0, 2.0)[0]
+    clock.now += 10
+    assert [backend.allow('k', 1.0, 2.0)[0] for _ in range(4)] == [True, True, True, False]
+
+def test_limited_request_does_not_consume_a_token(clock):
+    backend = MemoryRateLimitBackend()
+    backend.allow('k', 1.0, 0.0)
+    for _ in range(5):
+        assert not backend.allow('k', 1.0, 0.0)[0]
+    clock.now += 1.0
+    assert backend.allow('k', 1.0, 0.0)[0]
+
+def test_keys_are_independent(clock):
+    backend = MemoryRateLimitBackend()
+    assert backend.allow('a', 1.0, 0.0)[0]
+    assert not backend.allow('a', 1.0, 0.0)[0]
+    assert backend.allow('b', 1.0, 0.0)[0]
+
+def test_keys_with_full_buckets_are_evicted(clock):
+    backend = MemoryRateLimitBackend()
+    backend.allow('a', 1.0, 0.0)
+    clock.now += 2
+    backend.allow('b', 1.0, 0.0)
+    assert list(backend._tat) == ['b']
+
+def test_lru_eviction_caps_the_number_of_keys(clock):
+    backend = MemoryRateLimitBackend(max_keys=2)
+    for key in ('a', 'b', 'c'):
+        backend.allow(key, 60.0, 0.0)
+    assert list(backend._tat) == ['b', 'c']
+    # the evicted key starts over with a full bucket
+    assert backend.allow('a', 60.0, 0.0)[0]
+
+def test_postgres_backend_allows_when_the_upsert_returns_a_row():
+    assert PostgresRateLimitBackend(FakePool([(1.0,)]), cleanup_probability=0).allow('k', 1.0, 2.0) == (True, 0.0)
+
+def test_postgres_backend_limits_when_the_upsert_is_rejected():
+    assert PostgresRateLimitBackend(FakePool([]), cleanup_probability=0).allow('k', 1.0, 2.0) == (False, 1.0)
+
+def test_postgres_backend_fails_open():
+    class BrokenPool(FakePool):
+        def getconn(self, key=None, timeout=None):
+            raise ConnectionError('database down')
+    assert PostgresRateLimitBackend(BrokenPool(), cleanup_probability=0).allow('k', 1.0, 2.0) == (True, 0.0)
+
+def test_create_backend_rejects_unknown_names():
+    app = Flask(__name__)
+    app.config['RATE_LIMIT_BACKEND'] = 'redis'
+    with pytest.raises(ValueError):
+        create_backend(app)
+
+def test_decorator_answers_429_with_retry_after(clock):
+    app = Flask(__name__)
+    app.extensions['rate_limit_backend'] = MemoryRateLimitBackend()
+
+    @app.route('/limited')
+    @rate_limit_decorator(max_requests=2, per_seconds=10)
+    def limited():
+        return 'ok'
+
+    client = app.test_client()
+    assert [client.get('/limited').status_code for _ in range(2)] == [200, 200]
+    response = client.get('/limited')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '5'
@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import OrderedDict
+from utilities.metrics import CACHE_EVENTS
+
+class TTLCache:
+    """Thread-safe LRU cache where every entry carries its own expiry time."""
+
+    def __init__(self, name, maxsize=10000):
+        self.name = name
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = CACHE_EVENTS.labels(cache=name, event='hit')
+        self._misses = CACHE_EVENTS.labels(cache=name, event='miss')
+        self._evictions = CACHE_EVENTS.labels(cache=name, event='evict')
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._data.move_to_end(key)
+                    self._hits.inc()
+                    return entry[0]
+                del self._data[key]
+        self._misses.inc()
+        return None
+
+    def set(self, key, value, expires_at):
+        if self.maxsize <= 0 or expires_at <= time.time():
+            return
+        evicted = 0
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self._evictions.inc(evicted)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def remove_where(self, predicate):
+        with self._lock:
+            keys = [key for key, (value, _) in self._data.items() if predicate(value)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from time import perf_counter
+from flask import current_app
+from utilities.metrics import DB_STATEMENT_SECONDS
+
+class DatabaseUnavailable(Exception):
+    pass
+
+def database_available():
+    connection = getattr(current_app.db_pool, 'connection', None)
+    return connection is None or connection.available
+
+class Statement:
+    """SQL prepared once per pooled connection and run with EXECUTE afterwards.
+
+    The text uses $1..$n placeholders and must not change between calls, so
+    optional filters are expressed with neutral default values instead of
+    building the query string.
+    """
+
+    def __init__(self, name, sql, param_count):
+        self.name = name
+        self.prepare_sql = f"PREPARE {name} AS {sql}"
+        placeholders = ', '.join(['%s'] * param_count)
+        self.execute_sql = f"EXECUTE {name} ({placeholders})" if param_count else f"EXECUTE {name}"
+        self.param_count = param_count
+
+def execute(cur, statement, params=()):
+    if len(params) != statement.param_count:
+        raise ValueError(f"{statement.name} expects {statement.param_count} parameters, got {len(params)}")
+    prepared = cur.connection.prepared_statements
+    if statement.name not in prepared:
+        cur.execute(statement.prepare_sql)
+        prepared.add(statement.name)
+    start = perf_counter()
+    try:
+        cur.execute(statement.execute_sql, params)
+    finally:
+        DB_STATEMENT_SECONDS.labels(statement.name).observe(perf_counter() - start)
+    return cur
+
+@contextmanager
+def transaction():
+    """Cursor on a pooled connection; commits on success, rolls back on error, always returns the connection."""
+    if not database_available():
+        raise DatabaseUnavailable("Database is currently unavailable")
+    pool = current_app.db_pool
+    conn = pool.getconn()
+    cur = None
+    try:
+        cur = conn.cursor()
+        yield cur
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if cur:
+            cur.close()
+        pool.putconn(conn)
@@ -0,0 +1,282 @@
+import os
+import threading
+import time
+import weakref
+from time import perf_counter
+from collections import deque
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+from utilities.metrics import DB_POOL_CONNECTIONS, DB_POOL_WAITING, DB_POOL_ACQUIRE_SECONDS
+from utilities.timing import add_time
+
+class PoolTimeout(PoolError):
+    pass
+
+class TimedCursor(extensions.cursor):
+    """Adds the time spent in the database to the current request's timings."""
+
+    def execute(self, query, vars=None):
+        start = perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            add_time('db', perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            add_time('db', perf_counter() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            add_time('db', perf_counter() - start)
+
+    def fetchmany(self, size=None):
+        # server-side (named) cursors round-trip on every fetch
+        start = perf_counter()
+        try:
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+        finally:
+            add_time('db', perf_counter() - start)
+
+class PooledConnection(extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.cursor_factory = TimedCursor
+        self.prepared_statements = set()
+
+    def commit(self):
+        start = perf_counter()
+        try:
+            return super().commit()
+        finally:
+            add_time('db', perf_counter() - start)
+
+class BlockingConnectionPool:
+    """Thread-safe psycopg2 pool that waits for a free connection.
+
+    Keeps the getconn/putconn interface of psycopg2.pool so existing call
+    sites work unchanged. Nothing is opened in the constructor; connections
+    are made on demand or by fill(). They are validated on checkout, recycled
+    after max_age seconds, rolled back when they come back mid-transaction and
+    reset when the caller changed session settings.
+    """
+
+    def __init__(self, minconn, maxconn, dsn=None, acquire_timeout=10.0,
+                 max_age=1800.0, validate_after=30.0, **kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.max_age = max_age
+        self.validate_after = validate_after
+        self.closed = False
+        self._dsn = dsn
+        self._kwargs = kwargs
+        self._reset_state()
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() and ref()._reset_state())
+        # Reconnector reporting availability; told when the database stops answering
+        self.connection = None
+        self._update_gauges()
+
+    def _reset_state(self):
+        # In a forked child the parent's threads are gone, so the condition may be held
+        # or a slot counted for a connection that is still being opened. Inherited
+        # connections are kept referenced but never used: closing them, even through
+        # garbage collection, would end the parent's sessions.
+        if hasattr(self, '_idle'):
+            self._inherited = list(self._idle) + list(self._used.values())
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._used = {}
+        self._size = 0
+        self._waiting = 0
+
+    def fill(self):
+        """Open connections until minconn exist; the pool itself connects lazily."""
+        while True:
+            with self._cond:
+                if self.closed or self._size >= self.minconn:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(conn)
+                self._cond.notify()
+                self._update_gauges()
+
+    def probe(self):
+        """fill(), then run a query; the pool's Reconnector uses this to decide the database is back."""
+        self.fill()
+        conn = self.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+        finally:
+            self.putconn(conn)
+
+    def getconn(self, key=None, timeout=None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        conn = None
+
+        with self._cond:
+            while True:
+                if self.closed:
+                    raise PoolError("connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    DB_POOL_ACQUIRE_SECONDS.observe(time.monotonic() - start)
+                    raise PoolTimeout(f"no database connection available after {timeout:.1f}s")
+                self._waiting += 1
+                DB_POOL_WAITING.set(self._waiting)
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                    DB_POOL_WAITING.set(self._waiting)
+
+        try:
+            conn = self._prepare_checkout(conn)
+        except Exception as e:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+                self._update_gauges()
+            if isinstance(e, psycopg2.OperationalError):
+                self._report_outage()
+            raise
+
+        with self._cond:
+            self._used[id(conn)] = conn
+            self._update_gauges()
+        DB_POOL_ACQUIRE_SECONDS.observe(time.monotonic() - start)
+        return conn
+
+    def putconn(self, conn, key=None, close=False):
+        with self._cond:
+            if self._used.pop(id(conn), None) is None:
+                raise PoolError("trying to put unkeyed connection")
+
+        if conn.closed and not self.closed:
+            # the server went away while the connection was checked out
+            self._report_outage()
+        if not close and not self.closed:
+            close = not self._reset(conn)
+
+        with self._cond:
+            if close or self.closed or conn.closed:
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+            self._cond.notify()
+            self._update_gauges()
+
+    def closeall(self):
+        with self._cond:
+            if self.closed:
+                raise PoolError("connection pool is closed")
+            self.closed = True
+            for conn in list(self._idle) + list(self._used.values()):
+                self._close_quietly(conn)
+            self._idle.clear()
+            self._used.clear()
+            self._size = 0
+            self._cond.notify_all()
+            self._update_gauges()
+
+    def clear(self):
+        """Close idle connections; the pool stays open and reconnects on demand."""
+        with self._cond:
+            while self._idle:
+                self._close_quietly(self._idle.pop())
+                self._size -= 1
+            self._update_gauges()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'in_use': len(self._used),
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'max': self.maxconn
+            }
+
+    def _connect(self):
+        return psycopg2.connect(self._dsn, connection_factory=PooledConnection, **self._kwargs)
+
+    def _prepare_checkout(self, conn):
+        if conn is None:
+            return self._connect()
+        now = time.monotonic()
+        if conn.closed or now - conn.created_at > self.max_age:
+            self._close_quietly(conn)
+            return self._connect()
+        if now - conn.last_used > self.validate_after:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                self._close_quietly(conn)
+                return self._connect()
+        return conn
+
+    def _reset(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.created_at > self.max_age:
+            return False
+        status = conn.info.transaction_status
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            if conn.autocommit or conn.readonly is not None or conn.deferrable is not None \
+                    or conn.isolation_level is not None:
+                # the caller changed session settings; reset() discards the whole session
+                conn.reset()
+                conn.prepared_statements.clear()
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                # read-only handlers return without committing; prepared statements survive a rollback
+                conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _report_outage(self):
+        if self.connection:
+            self.connection.mark_down()
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _update_gauges(self):
+        DB_POOL_CONNECTIONS.labels(state='in_use').set(len(self._used))
+        DB_POOL_CONNECTIONS.labels(state='idle').set(len(self._idle))
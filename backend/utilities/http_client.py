@@ -0,0 +1,92 @@
+import os
+from time import perf_counter
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from utilities.metrics import HTTP_CLIENT_SECONDS, HTTP_CLIENT_CONNECTIONS
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+def _counting_pool(base, counter):
+    class CountingPool(base):
+        def _new_conn(self):
+            counter.inc()
+            return super()._new_conn()
+    return CountingPool
+
+class InstrumentedAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools count every new TCP connection."""
+
+    def __init__(self, client, **kwargs):
+        self.client = client
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        counter = HTTP_CLIENT_CONNECTIONS.labels(client=self.client)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool(HTTPConnectionPool, counter),
+            'https': _counting_pool(HTTPSConnectionPool, counter)
+        }
+
+def _no_auth(request):
+    # like python-keycloak's own session: never let requests add .netrc credentials
+    return request
+
+class HTTPSession(requests.Session):
+    """Thread-safe keep-alive session with default (connect, read) timeouts and metrics.
+
+    Connection errors are retried for every method; read errors and 502-504
+    responses only for idempotent ones, so a POST is never sent twice.
+    """
+
+    def __init__(self, client, connect_timeout=3.0, read_timeout=10.0, pool_size=10, retries=2):
+        super().__init__()
+        self.client = client
+        self.timeout = (connect_timeout, read_timeout)
+        self.auth = _no_auth
+        adapter = InstrumentedAdapter(
+            client,
+            pool_connections=4,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.2,
+                allowed_methods=IDEMPOTENT_METHODS,
+                status_forcelist=(502, 503, 504),
+                raise_on_status=False
+            )
+        )
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        os.register_at_fork(after_in_child=self.clear_pools)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        start = perf_counter()
+        status = 'error'
+        try:
+            response = super().request(method, url, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            HTTP_CLIENT_SECONDS.labels(self.client, method.upper(), status).observe(perf_counter() - start)
+
+    def close(self):
+        # shared for the life of the process; python-keycloak closes its session when garbage collected
+        pass
+
+    def clear_pools(self):
+        # sockets inherited from a gunicorn master must not be shared with the worker
+        for adapter in self.adapters.values():
+            adapter.poolmanager.clear()
+
+keycloak_http = HTTPSession(
+    'keycloak',
+    connect_timeout=float(os.getenv('KEYCLOAK_CONNECT_TIMEOUT', 3)),
+    read_timeout=float(os.getenv('KEYCLOAK_READ_TIMEOUT', 10)),
+    pool_size=int(os.getenv('KEYCLOAK_HTTP_POOL_SIZE', 10)),
+    retries=int(os.getenv('KEYCLOAK_HTTP_RETRIES', 2))
+)
@@ -1,35 +1,55 @@
 from functools import wraps
 from flask import request, jsonify, current_app
 import jwt
-import requests
-from keycloak import KeycloakOpenID, KeycloakAdmin
+from keycloak import KeycloakOpenID, KeycloakAdmin, KeycloakOpenIDConnection
+from keycloak.exceptions import KeycloakAuthenticationError
 from datetime import datetime, timedelta, timezone
+import hashlib
+import threading
+from utilities.keycloak_keys import KeycloakKeyCache
+from utilities.cache import TTLCache
+from utilities.timing import track_dependency
+from utilities.http_client import keycloak_http
 
-def get_keycloak_client():
-    server_url = current_app.config.get('KEYCLOAK_URL', 'http://keycloak:8080') + '/auth'
-    client_id = current_app.config.get('KEYCLOAK_CLIENT_ID', 'datamed-client')
-    realm_name = current_app.config.get('KEYCLOAK_REALM', 'datamed')
-    client_secret = current_app.config.get('KEYCLOAK_CLIENT_SECRET', None)
-
-    return KeycloakOpenID(
-        server_url=server_url,
-        client_id=client_id,
-        realm_name=realm_name,
-        client_secret_key=client_secret
-    )
-def get_keycloak_public_key():
-    server_url = current_app.config.get('KEYCLOAK_URL', 'http://keycloak:8080') + '/auth'
-    realm_name = current_app.config.get('KEYCLOAK_REALM', 'datamed')
-
-    url = f"{server_url}/realms/{realm_name}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        public_key = data.get('public_key')
-        if public_key:
-            return f"-----BEGIN PUBLIC KEY-----\n{public_key}\n-----END PUBLIC KEY-----"
+key_cache = KeycloakKeyCache()
+token_cache = TTLCache('verified_token')
+
+def _token_cache_key(token):
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+def get_bearer_token():
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
         return None
+    parts = auth_header.split()
+    if len(parts) != 2 or parts[0].lower() != 'bearer':
+        return None
+    return parts[1]
+
+def invalidate_token(token):
+    if token:
+        token_cache.pop(_token_cache_key(token))
+
+def invalidate_user_tokens(user_id):
+    return token_cache.remove_where(lambda claims: claims[0] == user_id)
+
+def keycloak_realm_url(config):
+    server_url = config.get('KEYCLOAK_URL', 'http://keycloak:8080') + '/auth'
+    realm_name = config.get('KEYCLOAK_REALM', 'datamed')
+    return f"{server_url}/realms/{realm_name}"
+
+def keycloak_certs_url(config):
+    return f"{keycloak_realm_url(config)}/protocol/openid-connect/certs"
+
+def fetch_signing_keys():
+    # the key cache refreshes itself once primed; this only has to succeed once
+    if not key_cache.refresh():
+        raise ConnectionError("Could not fetch the Keycloak signing keys")
+
+def get_keycloak_public_key(kid=None):
+    key_cache.configure(keycloak_certs_url(current_app.config), ttl=current_app.config.get('KEYCLOAK_KEY_CACHE_TTL'))
+    try:
+        return key_cache.get_key(kid)
     except Exception as e:
         return None
 def keycloak_token_required(f):
@@ -45,9 +65,18 @@ def keycloak_token_required(f):
             if len(parts) != 2 or parts[0].lower() != 'bearer':
                 return jsonify({'error': 'Invalid authorization header format'}), 401
             token = parts[1]
-            public_key = get_keycloak_public_key()
+            cache_key = _token_cache_key(token)
+            cached = token_cache.get(cache_key)
+            if cached is not None:
+                request.environ['datamed.user_id'] = cached[0]
+                return f(cached[0], list(cached[1]), *args, **kwargs)
+            kid = jwt.get_unverified_header(token).get('kid')
+            public_key = get_keycloak_public_key(kid)
             if not public_key:
-                return jsonify({'error': 'Could not retrieve Keycloak public key'}), 500
+                if key_cache.loaded:
+                    # kid comes from the token itself; an unknown one is the client's problem
+                    return jsonify({'error': 'Invalid token: unknown signing key'}), 401
+                return jsonify({'error': 'Could not retrieve Keycloak public key'}), 503
             options = {
                 'verify_signature': True,
                 'verify_aud': False,
@@ -70,6 +99,9 @@ def keycloak_token_required(f):
                 return jsonify({'error': 'Token has expired'}), 401
             realm_access = decoded_token.get('realm_access', {})
             roles = realm_access.get('roles', [])
+            if exp:
+                token_cache.set(cache_key, (user_id, tuple(roles)), exp)
+            request.environ['datamed.user_id'] = user_id
             return f(user_id, roles, *args, **kwargs)
 
         except jwt.ExpiredSignatureError:
@@ -81,34 +113,126 @@ def keycloak_token_required(f):
 
     return decorator
 def get_user_info(token):
+    # called directly rather than through KeycloakOpenID, which sets the bearer token on shared headers
     try:
-        keycloak_client = get_keycloak_client()
-        user_info = keycloak_client.userinfo(token)
-        return user_info
+        with track_dependency('keycloak', 'userinfo'):
+            response = keycloak_http.get(
+                f"{keycloak_realm_url(current_app.config)}/protocol/openid-connect/userinfo",
+                headers={'Authorization': f'Bearer {token}'}
+            )
+        response.raise_for_status()
+        return response.json()
     except Exception as e:
         return None
-def get_keycloak_admin():
-    server_url = current_app.config.get('KEYCLOAK_URL', 'http://keycloak:8080') + '/auth'
-    realm_name = current_app.config.get('KEYCLOAK_REALM', 'datamed')
-    admin_username = 'admin'
-    admin_password = 'admin'
+class PooledOpenIDConnection(KeycloakOpenIDConnection):
+    """Admin connection whose API, login and refresh calls all go through keycloak_http."""
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, timeout=keycloak_http.timeout, **kwargs)
+        # ConnectionManager hard-codes a 60s timeout and its own session
+        self.timeout = keycloak_http.timeout
+        self._s = keycloak_http
+
+    def get_token(self):
+        # same flow as python-keycloak, with the token client bound to the shared session before it logs in
+        self.keycloak_openid = KeycloakOpenID(
+            server_url=self.server_url,
+            client_id=self.client_id,
+            realm_name=self.user_realm_name or self.realm_name or 'master',
+            verify=self.verify,
+            client_secret_key=self.client_secret_key,
+            timeout=keycloak_http.timeout
+        )
+        self.keycloak_openid.connection._s = keycloak_http
+        if self.client_secret_key:
+            grant_type = ['client_credentials']
+        elif self.username and self.password:
+            grant_type = ['password']
+        else:
+            self.token = None
+            return
+        self.token = self.keycloak_openid.token(self.username, self.password, grant_type=grant_type, totp=self.totp)
+
+class KeycloakAdminSession:
+    """Process-wide KeycloakAdmin that logs in once and refreshes its token before expiry.
+
+    The refresh happens under a lock before handing out the client, so
+    threads never race to renew the token inside python-keycloak.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._settings = None
+        self._connection = None
+        self._admin = None
+
+    def configure(self, server_url, realm_name, username, password, user_realm_name):
+        settings = (server_url, realm_name, username, password, user_realm_name)
+        with self._lock:
+            if settings == self._settings:
+                return
+            # the login happens in get(), so a failed one is retried on the next call
+            self._settings = settings
+            self._connection = None
+            self._admin = None
+
+    def get(self):
+        with self._lock:
+            if self._settings is None:
+                return None
+            if self._connection is None:
+                server_url, realm_name, username, password, user_realm_name = self._settings
+                with track_dependency('keycloak', 'admin_token'):
+                    connection = PooledOpenIDConnection(
+                        server_url=server_url,
+                        username=username,
+                        password=password,
+                        realm_name=realm_name,
+                        user_realm_name=user_realm_name,
+                        verify=True
+                    )
+                self._connection = connection
+                self._admin = KeycloakAdmin(connection=connection)
+            elif datetime.now() >= self._connection.expires_at:
+                # refresh grant when possible; python-keycloak falls back to a password login
+                with track_dependency('keycloak', 'admin_token'):
+                    self._connection.refresh_token()
+            return self._admin
+
+    def invalidate(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.token = None
+
+admin_session = KeycloakAdminSession()
+
+def get_keycloak_admin():
     try:
-        keycloak_admin = KeycloakAdmin(
-            server_url=server_url,
-            username=admin_username,
-            password=admin_password,
-            realm_name=realm_name,
-            verify=True
+        admin_session.configure(
+            server_url=current_app.config.get('KEYCLOAK_URL', 'http://keycloak:8080') + '/auth',
+            realm_name=current_app.config.get('KEYCLOAK_REALM', 'datamed'),
+            username=current_app.config.get('KEYCLOAK_ADMIN_USERNAME'),
+            password=current_app.config.get('KEYCLOAK_ADMIN_PASSWORD'),
+            user_realm_name=current_app.config.get('KEYCLOAK_ADMIN_REALM', 'master')
         )
-        return keycloak_admin
+        return admin_session.get()
     except Exception as e:
+        admin_session.invalidate()
         return None
+
+def admin_call(operation, method, *args):
+    keycloak_admin = get_keycloak_admin()
+    if not keycloak_admin:
+        raise Exception("Could not initialize Keycloak admin client")
+    try:
+        with track_dependency('keycloak', operation):
+            return getattr(keycloak_admin, method)(*args)
+    except KeycloakAuthenticationError:
+        # token revoked on the server side; log in again on the next call
+        admin_session.invalidate()
+        raise
 def create_keycloak_user(email, password, first_name=None, last_name=None):
     try:
-        keycloak_admin = get_keycloak_admin()
-        if not keycloak_admin:
-            raise Exception("Could not initialize Keycloak admin client")
         user_data = {
             "email": email,
             "username": email,
@@ -126,25 +250,19 @@ def create_keycloak_user(email, password, first_name=None, last_name=None):
             user_data["firstName"] = first_name
         if last_name:
             user_data["lastName"] = last_name
-        user_id = keycloak_admin.create_user(user_data)
+        user_id = admin_call('create_user', 'create_user', user_data)
         return user_id
     except Exception as e:
         raise
 def delete_keycloak_user(user_id):
     try:
-        keycloak_admin = get_keycloak_admin()
-        if not keycloak_admin:
-            raise Exception("Could not initialize Keycloak admin client")
-        keycloak_admin.delete_user(user_id)
+        admin_call('delete_user', 'delete_user', user_id)
         return True
     except Exception as e:
         return False
 def find_keycloak_user_by_email(email):
     try:
-        keycloak_admin = get_keycloak_admin()
-        if not keycloak_admin:
-            raise Exception("Could not initialize Keycloak admin client")
-        users = keycloak_admin.get_users({"email": email})
+        users = admin_call('get_users', 'get_users', {"email": email})
 
         if not users or len(users) == 0:
             return None
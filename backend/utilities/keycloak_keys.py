@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+import logging
+import weakref
+from jwt.algorithms import RSAAlgorithm
+from utilities.metrics import KEYCLOAK_KEY_CACHE
+from utilities.timing import track_dependency
+from utilities.http_client import keycloak_http
+
+logger = logging.getLogger('app')
+
+class _Fetch:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = False
+
+class KeycloakKeyCache:
+    """Process-wide cache of the realm signing keys, keyed by kid.
+
+    Keys are refreshed by a daemon thread shortly before the TTL runs out, so
+    the request path only reads a dict. An unknown kid triggers one synchronous
+    refetch (rate limited), and failed refreshes keep the last good keys.
+    _lock only guards state, never the HTTP fetch, so a process forked while
+    a fetch is in flight (gunicorn preload) does not inherit a held lock.
+    A failed fetch marks connection (the keycloak Reconnector) down, if set.
+    """
+
+    def __init__(self, ttl=300, refresh_margin=30, retry_interval=10,
+                 unknown_kid_cooldown=10, timeout=None):
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.unknown_kid_cooldown = unknown_kid_cooldown
+        self.timeout = timeout
+        self._certs_url = None
+        self._keys = {}
+        self._expires_at = 0.0
+        self._last_forced_fetch = 0.0
+        self.connection = None
+        self._reset_threading()
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() and ref()._reset_threading())
+
+    def _reset_threading(self):
+        # also runs in a forked child, where the parent's threads no longer exist
+        self._lock = threading.Lock()
+        self._inflight = None
+        self._refresher = None
+        self._wakeup = threading.Event()
+
+    def configure(self, certs_url, ttl=None):
+        if ttl is not None:
+            self.ttl = ttl
+        if certs_url != self._certs_url:
+            with self._lock:
+                self._certs_url = certs_url
+                self._keys = {}
+                self._expires_at = 0.0
+
+    @property
+    def loaded(self):
+        return bool(self._keys)
+
+    def get_key(self, kid):
+        keys = self._keys
+        key = self._lookup(keys, kid)
+        if key is not None:
+            KEYCLOAK_KEY_CACHE.labels(event='hit').inc()
+            self._ensure_refresher()
+            return key
+
+        KEYCLOAK_KEY_CACHE.labels(event='miss').inc()
+        with self._lock:
+            key = self._lookup(self._keys, kid)
+            if key is not None:
+                return key
+            if self._inflight is None:
+                now = time.monotonic()
+                if self._keys and now - self._last_forced_fetch < self.unknown_kid_cooldown:
+                    return None
+                self._last_forced_fetch = now
+        self.refresh()
+        self._ensure_refresher()
+        return self._lookup(self._keys, kid)
+
+    def refresh(self):
+        """Fetch the keys once; callers arriving during a fetch wait for its result."""
+        with self._lock:
+            inflight = self._inflight
+            if inflight is None:
+                inflight = self._inflight = _Fetch()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            inflight.done.wait()
+            return inflight.result
+
+        try:
+            inflight.result = self._fetch()
+        finally:
+            with self._lock:
+                self._inflight = None
+            inflight.done.set()
+        return inflight.result
+
+    def _lookup(self, keys, kid):
+        if kid is None:
+            if len(keys) == 1:
+                return next(iter(keys.values()))
+            return None
+        return keys.get(kid)
+
+    def _fetch(self):
+        certs_url = self._certs_url
+        if not certs_url:
+            return False
+        try:
+            with track_dependency('keycloak', 'jwks'):
+                response = keycloak_http.get(certs_url, timeout=self.timeout)
+            response.raise_for_status()
+            keys = {}
+            for jwk in response.json().get('keys', []):
+                if jwk.get('kty') != 'RSA' or jwk.get('use', 'sig') != 'sig':
+                    continue
+                keys[jwk.get('kid')] = RSAAlgorithm.from_jwk(jwk)
+            if not keys:
+                raise ValueError('No RSA signing keys in JWKS response')
+        except Exception as e:
+            KEYCLOAK_KEY_CACHE.labels(event='refresh_error').inc()
+            logger.warning(f"Keycloak key refresh failed, keeping {len(self._keys)} cached key(s): {e}")
+            if self.connection:
+                self.connection.mark_down()
+            return False
+
+        with self._lock:
+            if certs_url != self._certs_url:
+                # reconfigured while fetching; these keys belong to the old realm
+                return False
+            self._keys = keys
+            self._expires_at = time.monotonic() + self.ttl
+        KEYCLOAK_KEY_CACHE.labels(event='refresh').inc()
+        return True
+
+    def _ensure_refresher(self):
+        refresher = self._refresher
+        if refresher is not None and refresher.is_alive():
+            return
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(
+                target=self._run_refresher,
+                name='keycloak-key-refresher',
+                daemon=True
+            )
+            self._refresher.start()
+
+    def _run_refresher(self):
+        while True:
+            delay = self._expires_at - self.refresh_margin - time.monotonic()
+            if self._wakeup.wait(max(delay, 0)):
+                return
+            if not self.refresh():
+                if self._wakeup.wait(self.retry_interval):
+                    return
+
+    def stop(self):
+        self._wakeup.set()
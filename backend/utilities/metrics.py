@@ -0,0 +1,98 @@
+import os
+from prometheus_client import (Counter, Gauge, Histogram, CollectorRegistry, generate_latest,
+                               multiprocess, CONTENT_TYPE_LATEST)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'datamed_http_request_duration_seconds',
+    'Time from request start until the response body is closed',
+    ['method', 'route', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+
+HTTP_RESPONSE_BYTES = Histogram(
+    'datamed_http_response_size_bytes',
+    'Response body size',
+    ['method', 'route', 'status'],
+    buckets=(100, 1000, 10000, 100000, 1000000, 10000000, 100000000)
+)
+
+DEPENDENCY_SECONDS = Histogram(
+    'datamed_dependency_duration_seconds',
+    'Latency of calls to MinIO and Keycloak',
+    ['dependency', 'operation'],
+    buckets=LATENCY_BUCKETS
+)
+
+KEYCLOAK_KEY_CACHE = Counter(
+    'datamed_keycloak_key_cache_total',
+    'Keycloak signing key cache lookups and refreshes',
+    ['event']
+)
+
+CACHE_EVENTS = Counter(
+    'datamed_cache_total',
+    'In-process cache hits, misses and evictions',
+    ['cache', 'event']
+)
+
+DB_POOL_CONNECTIONS = Gauge(
+    'datamed_db_pool_connections',
+    'Database connections held by the pool',
+    ['state'],
+    multiprocess_mode='livesum'
+)
+
+DB_POOL_WAITING = Gauge(
+    'datamed_db_pool_waiting',
+    'Threads waiting for a database connection',
+    multiprocess_mode='livesum'
+)
+
+DB_POOL_ACQUIRE_SECONDS = Histogram(
+    'datamed_db_pool_acquire_seconds',
+    'Time spent waiting for a database connection',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+DB_STATEMENT_SECONDS = Histogram(
+    'datamed_db_statement_duration_seconds',
+    'Execution time of prepared statements',
+    ['statement'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+
+CONDITIONAL_REQUESTS = Counter(
+    'datamed_conditional_requests_total',
+    'Versioned reads answered with 304 (not_modified) or a full body (modified)',
+    ['resource', 'result']
+)
+
+DEPENDENCY_AVAILABLE = Gauge(
+    'datamed_dependency_available',
+    '1 once a dependency has been reached, 0 while reconnecting',
+    ['dependency'],
+    multiprocess_mode='livemin'
+)
+
+HTTP_CLIENT_SECONDS = Histogram(
+    'datamed_http_client_request_duration_seconds',
+    'Outbound HTTP requests made through a shared session, including retries',
+    ['client', 'method', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+
+HTTP_CLIENT_CONNECTIONS = Counter(
+    'datamed_http_client_connections_total',
+    'TCP connections opened by a shared session; compare with the request count to see reuse',
+    ['client']
+)
+
+def render_metrics():
+    # Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,13 +1,72 @@
 from minio import Minio
+from minio.datatypes import PostPolicy
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
 import os
+import urllib3
+import certifi
 from flask import current_app
 import io
-from datetime import timedelta
+import time
+from datetime import datetime, timedelta
+from utilities.cache import TTLCache
+from utilities.timing import track_dependency
+from utilities.reconnect import Reconnector
+from functools import wraps
+import logging
+
+logger = logging.getLogger('app')
+
+UPLOAD_PART_SIZE = 5 * 1024 * 1024
+DELETE_BATCH_SIZE = 1000
+
+class UploadRejected(Exception):
+    pass
+
+def storage_available():
+    handler = current_app.minio_handler
+    return handler is not None and handler.available
+
+def reports_outage(method):
+    """Send the handler back to reconnecting when MinIO cannot be reached."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except (urllib3.exceptions.HTTPError, OSError):
+            if self.connection:
+                self.connection.mark_down()
+            raise
+    return wrapper
+
+class ValidatingUploadStream:
+    """Read-only wrapper that enforces the size cap and magic bytes while MinIO reads the upload."""
+
+    def __init__(self, stream, max_size, magic=None):
+        self._stream = stream
+        self._max_size = max_size
+        self._magic = magic or b''
+        self._header = b''
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        if len(self._header) < len(self._magic):
+            self._header += data[:len(self._magic) - len(self._header)]
+            if not self._magic.startswith(self._header) or (not data and self._header != self._magic):
+                raise UploadRejected('Invalid PDF file')
+        self.bytes_read += len(data)
+        if self.bytes_read > self._max_size:
+            raise UploadRejected(f'File too large. Maximum size is {self._max_size // (1024 * 1024)}MB')
+        return data
 
 class MinioHandler:
     def __init__(self, app=None):
         self.client = None
+        self.http = None
+        self.connection = None
+        self.url_expiry = timedelta(seconds=int(os.getenv('MINIO_URL_EXPIRY', 3600)))
+        self.url_cache = TTLCache('presigned_url', maxsize=int(os.getenv('MINIO_URL_CACHE_SIZE', 50000)))
         if app:
             self.init_app(app)
 
@@ -29,61 +88,144 @@ class MinioHandler:
             minio_secret_key = os.getenv('MINIO_SECRET_KEY', 'minioadmin')
             
         self.bucket_name = os.getenv('MINIO_BUCKET', 'prescriptions')
+        self.public_url = os.getenv('MINIO_PUBLIC_URL', 'https://localhost/minio').rstrip('/')
 
         app.logger.info(f"Initializing MinIO with URL: {minio_url}, Bucket: {self.bucket_name}")
 
+        self.http = urllib3.PoolManager(
+            timeout=urllib3.util.Timeout(
+                connect=float(os.getenv('MINIO_CONNECT_TIMEOUT', 5)),
+                read=float(os.getenv('MINIO_READ_TIMEOUT', 300))
+            ),
+            maxsize=int(os.getenv('MINIO_HTTP_POOL_SIZE', 10)),
+            ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where(),
+            retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+        )
         self.client = Minio(
             minio_url,
             access_key=minio_access_key,
             secret_key=minio_secret_key,
-            secure=False
+            secure=False,
+            region=os.getenv('MINIO_REGION', 'us-east-1'),
+            http_client=self.http
         )
         
+        self.connection = Reconnector('minio', self.ensure_bucket)
+        self.connection.start()
+
+    @property
+    def available(self):
+        return self.connection is not None and self.connection.available
+
+    def ensure_bucket(self):
         try:
-            buckets = list(self.client.list_buckets())
-            app.logger.info(f"MinIO connection successful. Found {len(buckets)} buckets")
             if not self.client.bucket_exists(self.bucket_name):
                 self.client.make_bucket(self.bucket_name)
-                app.logger.info(f"Created bucket: {self.bucket_name}")
-            else:
-                app.logger.info(f"Bucket {self.bucket_name} already exists")
-                
+                logger.info(f"Created bucket: {self.bucket_name}")
         except S3Error as e:
             if e.code == 'AccessDenied':
-                app.logger.error(f"MinIO Access Denied - Check credentials and permissions. Error: {e}")
-            else:
-                app.logger.error(f"MinIO S3 Error: {e}")
-            raise
-        except Exception as e:
-            app.logger.error(f"MinIO connection failed: {e}")
+                logger.error(f"MinIO Access Denied - Check credentials and permissions. Error: {e}")
             raise
 
-    def upload_file(self, file_path, file_data, content_type=None):
+    def after_fork(self):
+        # Keep-alive sockets opened by the gunicorn master must not be shared by workers
+        if self.http:
+            self.http.clear()
+
+    @track_dependency('minio', 'upload')
+    @reports_outage
+    def upload_file(self, file_path, file_data, content_type=None, max_size=None, magic=None):
         try:
             if hasattr(file_data, 'read'):
-                file_data = file_data.read()
-            self.client.put_object(
-                self.bucket_name,
-                file_path,
-                io.BytesIO(file_data),
-                length=len(file_data),
-                content_type=content_type
-            )
+                stream = ValidatingUploadStream(file_data, max_size or float('inf'), magic)
+                self.client.put_object(
+                    self.bucket_name,
+                    file_path,
+                    stream,
+                    length=-1,
+                    part_size=UPLOAD_PART_SIZE,
+                    num_parallel_uploads=1,
+                    content_type=content_type
+                )
+            else:
+                self.client.put_object(
+                    self.bucket_name,
+                    file_path,
+                    io.BytesIO(file_data),
+                    length=len(file_data),
+                    content_type=content_type
+                )
+            return file_path
+        except S3Error as e:
+            current_app.logger.error(f"Error uploading file: {e}")
+            raise
+
+    def get_file_url(self, file_path):
+        url = self.url_cache.get(file_path)
+        if url is None:
             url = self.client.presigned_get_object(
                 self.bucket_name,
                 file_path,
-                expires=timedelta(days=7)  
+                expires=self.url_expiry
             )
-            
-            return url
-        except S3Error as e:
-            current_app.logger.error(f"Error uploading file: {e}")
-            raise
+            # hand out cached links only while they have at least a quarter of their lifetime left
+            self.url_cache.set(file_path, url, time.time() + self.url_expiry.total_seconds() * 0.75)
+        return url
+
+    def url_epoch(self):
+        # a body revalidated within one epoch still holds links with lifetime left (0.75 + 0.2 < 1)
+        return int(time.time() // (self.url_expiry.total_seconds() * 0.2))
 
+    def presigned_post(self, file_path, max_size, content_type, expires):
+        policy = PostPolicy(self.bucket_name, datetime.utcnow() + expires)
+        policy.add_equals_condition('key', file_path)
+        policy.add_equals_condition('Content-Type', content_type)
+        policy.add_content_length_range_condition(1, max_size)
+        fields = self.client.presigned_post_policy(policy)
+        fields['key'] = file_path
+        fields['Content-Type'] = content_type
+        return f"{self.public_url}/{self.bucket_name}", fields
+
+    @track_dependency('minio', 'inspect')
+    @reports_outage
+    def inspect_object(self, file_path, header_length):
+        stat = self.client.stat_object(self.bucket_name, file_path)
+        response = self.client.get_object(self.bucket_name, file_path, offset=0, length=header_length)
+        try:
+            return stat.size, response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    @track_dependency('minio', 'delete')
+    @reports_outage
     def delete_file(self, file_path):
+        self.url_cache.pop(file_path)
         try:
             self.client.remove_object(self.bucket_name, file_path)
             return True
         except S3Error as e:
             current_app.logger.error(f"Error deleting file: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    @track_dependency('minio', 'delete_batch')
+    @reports_outage
+    def delete_files(self, file_paths):
+        """Remove objects with multi-object delete requests; returns [(key, error)] for failures."""
+        errors = []
+        file_paths = list(file_paths)
+        for start in range(0, len(file_paths), DELETE_BATCH_SIZE):
+            batch = file_paths[start:start + DELETE_BATCH_SIZE]
+            for file_path in batch:
+                self.url_cache.pop(file_path)
+            try:
+                for error in self.client.remove_objects(
+                    self.bucket_name,
+                    [DeleteObject(file_path) for file_path in batch]
+                ):
+                    errors.append((error.name, error.message))
+            except S3Error as e:
+                errors.extend((file_path, str(e)) for file_path in batch)
+        for file_path, message in errors:
+            current_app.logger.error(f"Error deleting file {file_path}: {message}")
+        return errors
@@ -0,0 +1,83 @@
+import base64
+import json
+from datetime import datetime
+from flask import jsonify
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# ids are SERIAL (int4)
+MIN_ID = -2147483648
+MAX_ID = 2147483647
+
+# (sort key, id) bound that sorts after every row; used in prepared statements when there is no cursor
+NO_CURSOR = ('infinity', MAX_ID)
+
+class Page(list):
+    """List of rows plus the opaque cursor of the next page (None on the last page)."""
+
+    def __init__(self, items=(), next_cursor=None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+
+def encode_cursor(*values):
+    raw = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values],
+                     separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).rstrip(b'=').decode('ascii')
+
+def _valid_cursor_value(index, value):
+    # every cursor is (ISO date or timestamp, integer id); anything else would reach EXECUTE
+    if index == 0:
+        if not isinstance(value, str):
+            return False
+        try:
+            datetime.fromisoformat(value)
+        except ValueError:
+            return False
+        return True
+    return isinstance(value, int) and not isinstance(value, bool) and MIN_ID <= value <= MAX_ID
+
+def decode_cursor(cursor, size):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    if not all(_valid_cursor_value(index, value) for index, value in enumerate(values)):
+        raise ValueError('Invalid cursor')
+    return values
+
+def parse_page_args(args, cursor_size=2):
+    """Return (limit, cursor values) from the query string; limit defaults to DEFAULT_PAGE_SIZE."""
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return limit, decode_cursor(cursor, cursor_size) if cursor else None
+
+def page_limit(limit):
+    """LIMIT parameter for a keyset query: one extra row to detect a next page, NULL for all rows."""
+    return limit + 1 if limit else None
+
+def paginate(rows, limit, cursor_of):
+    """Trim a LIMIT n+1 result to n rows and compute the next cursor."""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*cursor_of(rows[-1]))
+
+def page_response(page):
+    response = jsonify(page)
+    next_cursor = getattr(page, 'next_cursor', None)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
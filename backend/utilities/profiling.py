@@ -0,0 +1,273 @@
+import cProfile
+import hashlib
+import hmac
+import io
+import itertools
+import json
+import marshal
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from flask import request, jsonify, current_app
+
+SIGNATURE_HEADER = 'X-Profile-Signature'
+SIGNATURE_MAX_AGE = 300
+PROFILE_ID_PATTERN = re.compile(r'[0-9]+-[0-9]+')
+
+def sign(key, timestamp=None):
+    """Header value for SIGNATURE_HEADER: '<unix time>:<hex HMAC-SHA256 of the time>'."""
+    timestamp = str(int(timestamp if timestamp is not None else time.time()))
+    digest = hmac.new(key.encode('utf-8'), timestamp.encode('ascii'), hashlib.sha256).hexdigest()
+    return f"{timestamp}:{digest}"
+
+def _frame_name(code):
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def collapse_stack(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class StackSampler:
+    """Samples the stacks of registered threads from one background thread.
+
+    The thread only runs while at least one request is being profiled.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def register(self):
+        counts = Counter()
+        with self._lock:
+            self._threads[threading.get_ident()] = counts
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        return counts
+
+    def unregister(self):
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._threads:
+                    self._thread = None
+                    return
+                targets = list(self._threads.items())
+            frames = sys._current_frames()
+            for ident, counts in targets:
+                frame = frames.get(ident)
+                if frame is not None:
+                    counts[collapse_stack(frame)] += 1
+
+class Profiler:
+    """Profiles sampled or explicitly requested requests and keeps the latest ones.
+
+    A request is profiled when random() < sample_rate or when it carries a
+    valid SIGNATURE_HEADER. mode is 'cprofile' (deterministic, pstats
+    output) or 'sample' (statistical, collapsed stacks for flamegraphs).
+    Profiles are files in directory, shared by all gunicorn workers and
+    named '<pid>-<n>'; the oldest beyond max_profiles are removed.
+    """
+
+    def __init__(self, key, directory, sample_rate=0.0, mode='cprofile', max_profiles=50, interval=0.005):
+        if mode not in ('cprofile', 'sample'):
+            raise ValueError(f"Unknown PROFILING_MODE: {mode}")
+        self.key = key
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.max_profiles = max_profiles
+        self._ids = itertools.count(1)
+        self._sampler = StackSampler(interval) if mode == 'sample' else None
+        os.makedirs(directory, exist_ok=True)
+
+    def verify(self, signature):
+        if not signature or not self.key:
+            return False
+        timestamp, _, _ = signature.partition(':')
+        try:
+            age = abs(time.time() - int(timestamp))
+        except ValueError:
+            return False
+        return age <= SIGNATURE_MAX_AGE and hmac.compare_digest(signature, sign(self.key, timestamp))
+
+    def should_profile(self, environ):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        return self.verify(environ.get('HTTP_X_PROFILE_SIGNATURE'))
+
+    def start(self):
+        if self._sampler:
+            return self._sampler.register()
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, data, environ, route, status, duration):
+        if self._sampler:
+            self._sampler.unregister()
+            data = dict(data)
+        else:
+            data.disable()
+            data.create_stats()
+            data = data.stats
+        profile_id = f"{os.getpid()}-{next(self._ids)}"
+        # the data file goes first: a listed profile always has its data
+        self._write(f"{profile_id}.data", marshal.dumps(data))
+        self._write(f"{profile_id}.json", json.dumps({
+            'id': profile_id,
+            'timestamp': time.time(),
+            'request_id': environ.get('datamed.request_id'),
+            'method': environ.get('REQUEST_METHOD'),
+            'path': environ.get('PATH_INFO'),
+            'route': route,
+            'status': status,
+            'duration_ms': round(duration * 1000, 2),
+            'mode': self.mode
+        }).encode('utf-8'))
+        self._prune()
+
+    def profiles(self):
+        """Metadata of the stored profiles, newest first."""
+        profiles = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                meta = self._read_meta(name[:-len('.json')])
+                if meta is not None:
+                    profiles.append(meta)
+        profiles.sort(key=lambda profile: profile['timestamp'], reverse=True)
+        return profiles
+
+    def get(self, profile_id):
+        if not PROFILE_ID_PATTERN.fullmatch(profile_id):
+            return None
+        profile = self._read_meta(profile_id)
+        if profile is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.data"), 'rb') as f:
+                data = marshal.load(f)
+        except FileNotFoundError:
+            return None
+        profile['data'] = Counter(data) if profile['mode'] == 'sample' else data
+        return profile
+
+    def _read_meta(self, profile_id):
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.json"), 'rb') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, name, payload):
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def _prune(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.name[:-len('.json')]))
+                except FileNotFoundError:
+                    pass
+        entries.sort()
+        # other workers may prune at the same time; a file that is already gone is fine
+        for _, profile_id in entries[:max(0, len(entries) - self.max_profiles)]:
+            for suffix in ('.json', '.data'):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+
+class ProfilingMiddleware:
+    def __init__(self, wsgi_app, profiler):
+        self.wsgi_app = wsgi_app
+        self.profiler = profiler
+
+    def __call__(self, environ, start_response):
+        if not self.profiler.should_profile(environ):
+            return self.wsgi_app(environ, start_response)
+
+        start_time = time.perf_counter()
+        data = self.profiler.start()
+        state = {'status': None, 'route': None, 'done': False}
+
+        def profiling_start_response(status, headers, *args):
+            state['status'] = int(status.split(' ', 1)[0])
+            # read now because Flask clears the request from the environ afterwards
+            url_rule = getattr(environ.get('werkzeug.request'), 'url_rule', None)
+            if url_rule is not None:
+                state['route'] = url_rule.rule
+            return start_response(status, headers, *args)
+
+        def finish():
+            if not state['done']:
+                state['done'] = True
+                self.profiler.stop(data, environ, state['route'], state['status'],
+                                   time.perf_counter() - start_time)
+
+        try:
+            body = self.wsgi_app(environ, profiling_start_response)
+        except Exception:
+            finish()
+            raise
+        return _ProfiledResponse(body, finish)
+
+class _ProfiledResponse:
+    def __init__(self, body, on_close):
+        self._body = body
+        self._on_close = on_close
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._on_close()
+
+def render_pstats(raw_stats, sort='cumulative', limit=100):
+    stream = io.StringIO()
+    stats = pstats.Stats(stream=stream)
+    stats.stats = dict(raw_stats)
+    stats.get_top_level_stats()
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+def dump_pstats(raw_stats):
+    """Binary .prof contents, loadable with pstats.Stats(path) or snakeviz."""
+    return marshal.dumps(raw_stats)
+
+def render_collapsed(counts):
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+def profiling_admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        profiler = current_app.extensions['profiler']
+        if not profiler.verify(request.headers.get(SIGNATURE_HEADER)):
+            return jsonify({'error': 'Invalid or missing profiling signature'}), 403
+        return f(profiler, *args, **kwargs)
+    return decorated_function
@@ -0,0 +1,87 @@
+import threading
+import time
+import random
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger('app')
+
+class MemoryRateLimitBackend:
+    """Per-process token bucket stored as one theoretical arrival time (GCRA) per key.
+
+    A key whose arrival time is in the past has a full bucket and carries no
+    state, so those entries are evicted from the front of the LRU.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._tat = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key, emission_interval, tolerance):
+        now = time.monotonic()
+        with self._lock:
+            tat = max(self._tat.get(key, now), now)
+            if tat - now > tolerance:
+                return False, tat - now - tolerance
+            self._tat[key] = tat + emission_interval
+            self._tat.move_to_end(key)
+            while self._tat:
+                oldest_key, oldest_tat = next(iter(self._tat.items()))
+                if oldest_tat > now and len(self._tat) <= self.max_keys:
+                    break
+                del self._tat[oldest_key]
+        return True, 0.0
+
+class PostgresRateLimitBackend:
+    """Token bucket shared by all workers, kept in the UNLOGGED rate_limits table.
+
+    One upsert both refills and consumes; when the WHERE clause rejects the
+    update no row comes back and the request is limited. Database time is
+    used so worker clocks do not matter. Errors fail open.
+    """
+
+    def __init__(self, pool, cleanup_probability=0.001):
+        self.pool = pool
+        self.cleanup_probability = cleanup_probability
+
+    def allow(self, key, emission_interval, tolerance):
+        conn = None
+        cur = None
+        try:
+            conn = self.pool.getconn()
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO rate_limits AS r (key, tat)
+                VALUES (%(key)s, extract(epoch FROM statement_timestamp()) + %(emission)s)
+                ON CONFLICT (key) DO UPDATE
+                SET tat = GREATEST(r.tat, extract(epoch FROM statement_timestamp())) + %(emission)s
+                WHERE GREATEST(r.tat, extract(epoch FROM statement_timestamp()))
+                    - extract(epoch FROM statement_timestamp()) <= %(tolerance)s
+                RETURNING tat
+            """, {'key': key, 'emission': emission_interval, 'tolerance': tolerance})
+            allowed = cur.fetchone() is not None
+            if random.random() < self.cleanup_probability:
+                cur.execute("DELETE FROM rate_limits WHERE tat < extract(epoch FROM statement_timestamp())")
+            conn.commit()
+            return allowed, 0.0 if allowed else emission_interval
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            logger.warning(f"Rate limit backend unavailable, allowing request: {e}")
+            return True, 0.0
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.pool.putconn(conn)
+
+default_backend = MemoryRateLimitBackend()
+
+def create_backend(app):
+    backend = app.config.get('RATE_LIMIT_BACKEND', 'memory')
+    if backend == 'postgres':
+        return PostgresRateLimitBackend(app.db_pool)
+    if backend == 'memory':
+        return MemoryRateLimitBackend(app.config.get('RATE_LIMIT_MAX_KEYS', 100000))
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
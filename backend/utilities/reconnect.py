@@ -0,0 +1,69 @@
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from utilities.metrics import DEPENDENCY_AVAILABLE
+
+logger = logging.getLogger('app')
+
+class Reconnector:
+    """Connects to a dependency from a daemon thread, retrying with exponential backoff.
+
+    connect() must raise until the dependency is usable. available flips to
+    True on the first success; callers that see the dependency fail again
+    call mark_down() to go back to reconnecting. A forked child restarts the
+    thread if the parent had not connected yet.
+    """
+
+    def __init__(self, name, connect, initial_delay=0.5, max_delay=30.0):
+        self.name = name
+        self.connect = connect
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.available = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._gauge = DEPENDENCY_AVAILABLE.labels(dependency=name)
+        self._gauge.set(0)
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() and ref()._after_fork())
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-reconnect', daemon=True)
+            self._thread.start()
+
+    def mark_down(self):
+        if self.available:
+            logger.warning(f"{self.name} became unavailable, reconnecting")
+            self.available = False
+            self._gauge.set(0)
+        self.start()
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        if not self.available:
+            self.start()
+
+    def _run(self):
+        delay = self.initial_delay
+        attempt = 1
+        while True:
+            try:
+                self.connect()
+            except Exception as e:
+                wait = delay * random.uniform(0.5, 1.0)
+                logger.warning(f"{self.name} connection attempt {attempt} failed, retrying in {wait:.1f}s: {e}")
+                time.sleep(wait)
+                delay = min(delay * 2, self.max_delay)
+                attempt += 1
+                continue
+            self.available = True
+            self._gauge.set(1)
+            logger.info(f"{self.name} connected after {attempt} attempt(s)")
+            return
@@ -1,7 +1,12 @@
 import re
-from flask import request, jsonify
+import math
+from flask import request, jsonify, current_app
 from functools import wraps
+from datetime import date
 import os
+from utilities.rate_limit import default_backend
+
+ISO_DATE_PATTERN = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2}')
 
 class InputValidator:
     @staticmethod
@@ -27,6 +32,18 @@ class InputValidator:
         pattern = r'^[a-zA-ZąćęłńóśźżĄĆĘŁŃÓŚŹŻ\s\-\']+$'
         return re.match(pattern, name) is not None
     
+    @staticmethod
+    def validate_date(value):
+        """Validate an ISO (YYYY-MM-DD) date string"""
+        # fromisoformat alone also takes week dates and the basic format (2024-W01-1, 20240101)
+        if not isinstance(value, str) or not ISO_DATE_PATTERN.fullmatch(value):
+            return False
+        try:
+            date.fromisoformat(value)
+            return True
+        except ValueError:
+            return False
+    
     @staticmethod
     def validate_password(password):
         if not password or len(password) < 8:
@@ -59,41 +76,37 @@ def validate_file_upload(f):
         if 'pdf_file' in request.files:
             file = request.files['pdf_file']
             max_size = int(os.getenv('MAX_FILE_SIZE', 10485760))  
-            if file and len(file.read()) > max_size:
-                return jsonify({'error': 'File too large. Maximum size is 10MB'}), 400
-            file.seek(0)  
+            if file and file.stream.seekable():
+                file.stream.seek(0, os.SEEK_END)
+                size = file.stream.tell()
+                file.stream.seek(0)
+                if size > max_size:
+                    return jsonify({'error': 'File too large. Maximum size is 10MB'}), 400
             allowed_extensions = os.getenv('ALLOWED_EXTENSIONS', 'pdf').split(',')
             if file.filename:
                 ext = file.filename.rsplit('.', 1)[1].lower()
                 if ext not in allowed_extensions:
                     return jsonify({'error': f'Invalid file type. Allowed: {", ".join(allowed_extensions)}'}), 400
-            if file.filename and file.filename.endswith('.pdf'):
-                file_header = file.read(4)
-                file.seek(0)  
-                if file_header != b'%PDF':
-                    return jsonify({'error': 'Invalid PDF file'}), 400
         
         return f(*args, **kwargs)
     return decorated_function
 
 def rate_limit_decorator(max_requests=60, per_seconds=60):
-    from collections import defaultdict
-    import time
-    
-    requests_dict = defaultdict(list)
+    emission_interval = per_seconds / max_requests
+    tolerance = per_seconds - emission_interval
     
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
-            current_time = time.time()
-            requests_dict[client_ip] = [
-                req_time for req_time in requests_dict[client_ip]
-                if current_time - req_time < per_seconds
-            ]
-            if len(requests_dict[client_ip]) >= max_requests:
-                return jsonify({'error': 'Rate limit exceeded'}), 429
-            requests_dict[client_ip].append(current_time)
+            if not current_app.config.get('RATE_LIMIT_ENABLED', True):
+                return f(*args, **kwargs)
+            backend = current_app.extensions.get('rate_limit_backend', default_backend)
+            key = f"{f.__name__}:{request.remote_addr}"
+            allowed, retry_after = backend.allow(key, emission_interval, tolerance)
+            if not allowed:
+                response = jsonify({'error': 'Rate limit exceeded'})
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return response, 429
             return f(*args, **kwargs)
         return decorated_function
     return decorator
@@ -0,0 +1,29 @@
+from decimal import Decimal
+import orjson
+from flask.json.provider import JSONProvider
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj):
+    """JSON bytes; dates as YYYY-MM-DD, datetimes as RFC 3339, UUIDs and dataclasses natively."""
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class OrjsonProvider(JSONProvider):
+    """Makes jsonify and request.get_json use orjson, so every endpoint shares one date format."""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
@@ -0,0 +1,30 @@
+import contextvars
+from contextlib import contextmanager
+from time import perf_counter
+from utilities.metrics import DEPENDENCY_SECONDS
+
+# Time spent per dependency during the current request, read by RequestLoggingMiddleware
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+def begin_request():
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+def end_request():
+    _request_timings.set(None)
+
+def add_time(dependency, seconds):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[dependency] = timings.get(dependency, 0.0) + seconds
+
+@contextmanager
+def track_dependency(dependency, operation):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+        DEPENDENCY_SECONDS.labels(dependency, operation).observe(elapsed)
+        add_time(dependency, elapsed)
@@ -0,0 +1,3 @@
+from app import create_app
+
+app, socketio = create_app()
@@ -32,9 +32,12 @@ function Dashboard() {
       let prescriptionsCount = 0;
       if (prescriptionsResponse.ok) {
         const prescriptions = await prescriptionsResponse.json();
-        prescriptionsCount = prescriptions.length;
+        // only the first page is fetched; a next cursor means there are more
+        prescriptionsCount = prescriptionsResponse.headers.get("X-Next-Cursor")
+          ? `${prescriptions.length}+`
+          : prescriptions.length;
       }
-      const notesResponse = await fetch(`${apiUrl}/notes`, {
+      const notesResponse = await fetch(`${apiUrl}/notes?view=summary`, {
         headers: {
           Authorization: `Bearer ${token}`,
         },
@@ -43,7 +46,9 @@ function Dashboard() {
       let notesCount = 0;
       if (notesResponse.ok) {
         const notes = await notesResponse.json();
-        notesCount = notes.length;
+        notesCount = notesResponse.headers.get("X-Next-Cursor")
+          ? `${notes.length}+`
+          : notes.length;
       }
       const profileResponse = await fetch(`${apiUrl}/doctors`, {
         headers: {
@@ -7,6 +7,7 @@ function Notes() {
   const apiUrl = process.env.REACT_APP_API_URL || 'https://localhost/api';
   const navigate = useNavigate();
   const [notes, setNotes] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
   const [showAddForm, setShowAddForm] = useState(false);
@@ -40,6 +41,7 @@ function Notes() {
       if (!response.ok) throw new Error("Failed to fetch notes");
       const data = await response.json();
       setNotes(data);
+      setNextCursor(response.headers.get("X-Next-Cursor"));
     } catch (err) {
       setError(err.message);
     } finally {
@@ -47,6 +49,27 @@ function Notes() {
     }
   };
 
+  const loadMoreNotes = async () => {
+    if (!nextCursor) return;
+    try {
+      const token = getToken();
+      if (!token) return;
+
+      const response = await fetch(`${apiUrl}/notes?cursor=${encodeURIComponent(nextCursor)}`, {
+        headers: {
+          Authorization: `Bearer ${token}`,
+        },
+      });
+
+      if (!response.ok) throw new Error("Failed to load more notes");
+      const data = await response.json();
+      setNotes((previous) => [...previous, ...data]);
+      setNextCursor(response.headers.get("X-Next-Cursor"));
+    } catch (err) {
+      setError(err.message);
+    }
+  };
+
   useEffect(() => {
     fetchNotes();
   }, []);
@@ -236,6 +259,12 @@ function Notes() {
           })}
         </div>
       )}
+
+      {!loading && nextCursor && (
+        <div className="load-more">
+          <button onClick={loadMoreNotes}>Load more</button>
+        </div>
+      )}
     </div>
   );
 }
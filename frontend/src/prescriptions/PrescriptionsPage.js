@@ -7,6 +7,7 @@ function PrescriptionsPage() {
   const apiUrl = process.env.REACT_APP_API_URL || 'https://localhost/api';
   const navigate = useNavigate();
   const [prescriptions, setPrescriptions] = useState([]);
+  const [nextPage, setNextPage] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
   const [showAddForm, setShowAddForm] = useState(false);
@@ -43,6 +44,36 @@ function PrescriptionsPage() {
     old_password: "",
     new_password: "",
   });
+  // lists come in pages; X-Next-Cursor holds the cursor of the next one
+  const rememberNextPage = (url, response) => {
+    const cursor = response.headers.get("X-Next-Cursor");
+    setNextPage(cursor ? { url, cursor } : null);
+  };
+
+  const loadMorePrescriptions = async () => {
+    if (!nextPage) return;
+    try {
+      const token = getToken();
+      const separator = nextPage.url.includes("?") ? "&" : "?";
+      const response = await fetch(
+        `${nextPage.url}${separator}cursor=${encodeURIComponent(nextPage.cursor)}`,
+        {
+          method: "GET",
+          headers: {
+            Authorization: `Bearer ${token}`,
+          },
+          credentials: "include",
+        }
+      );
+      if (!response.ok) throw new Error("Failed to load more prescriptions");
+      const data = await response.json();
+      setPrescriptions((previous) => [...previous, ...data]);
+      rememberNextPage(nextPage.url, response);
+    } catch (err) {
+      setError(err.message);
+    }
+  };
+
   const fetchPrescriptions = async () => {
     setLoading(true);
     try {
@@ -59,11 +90,13 @@ function PrescriptionsPage() {
       }
       if (response.status === 404) {
         setPrescriptions([]);
+        setNextPage(null);
         return;
       }
       if (!response.ok) throw new Error("Failed to fetch prescriptions");
       const data = await response.json();
       setPrescriptions(data);
+      rememberNextPage(`${apiUrl}/prescriptions`, response);
     } catch (err) {
       setError(err.message);
     } finally {
@@ -191,8 +224,9 @@ function PrescriptionsPage() {
         start_date: searchPerson.start_date,
         end_date: searchPerson.end_date,
       });
+      const url = `${apiUrl}/prescriptions/search/person?${queryParams}`;
       const response = await fetch(
-        `${apiUrl}/prescriptions/search/person?${queryParams}`,
+        url,
         {
           method: "GET",
           headers: {
@@ -204,6 +238,7 @@ function PrescriptionsPage() {
       if (!response.ok) throw new Error("Failed to search by person");
       const data = await response.json();
       setPrescriptions(data);
+      rememberNextPage(url, response);
     } catch (err) {
       setError(err.message);
     }
@@ -212,8 +247,9 @@ function PrescriptionsPage() {
   const handleSearchByMedication = async () => {
     try {
       const token = getToken();
+      const url = `${apiUrl}/prescriptions/search/medication?medication=${encodeURIComponent(searchMedication)}`;
       const response = await fetch(
-        `${apiUrl}/prescriptions/search/medication?medication=${searchMedication}`,
+        url,
         {
           method: "GET",
           headers: {
@@ -225,6 +261,7 @@ function PrescriptionsPage() {
       if (!response.ok) throw new Error("Failed to search by medication");
       const data = await response.json();
       setPrescriptions(data);
+      rememberNextPage(url, response);
     } catch (err) {
       setError(err.message);
     }
@@ -551,6 +588,14 @@ function PrescriptionsPage() {
         )}
       </div>
 
+      {!loading && nextPage && (
+        <div className="load-more">
+          <button onClick={loadMorePrescriptions} className="load-more-button">
+            Load more
+          </button>
+        </div>
+      )}
+
       {advancedTools && (
         <div className="advanced-tools">
           <h2>Advanced Tools</h2>